@@ -1,17 +1,55 @@
+import csv
+import logging
+import uuid
 from datetime import datetime
+from itertools import islice
+from typing import AsyncIterator, Iterator
 from zoneinfo import ZoneInfo
 
+from sqlalchemy import Row, and_, case, func, insert, or_, update
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from sqlalchemy.orm import selectinload
 from fastapi import HTTPException, status
+from fastapi.concurrency import run_in_threadpool
 
 import api.models.card as card_model
 import api.models.deck as deck_model
+import api.models.user as user_model
 import api.schemas.card as card_schema
+import api.cruds.deck as deck_crud
 import api.cruds.user as user_crud
-from api.utils.oblivion_curve import get_next_answer_date
-from api.cruds.common import get_model_by_id
+from api.utils.oblivion_curve import (
+    get_answered_at,
+    get_next_answer_date,
+    level_and_score_mapping,
+)
+from api.utils.deck_counters import add_due_increment, rebuild_due_buckets
+from api.utils.scheduler import get_last_interval, get_scheduler
+from api.utils.pagination import decode_cursor, encode_cursor
+from api.cruds.common import add_seconds, get_model_by_id
+from api.db import async_session
+
+
+logger = logging.getLogger(__name__)
+
+EXPORT_BATCH_SIZE = 1000
+IMPORT_BATCH_SIZE = 500
+IMPORT_MAX_ERRORS = 100
+
+CARD_RESPONSE_COLUMNS = [
+    card_model.Card.sentence,
+    card_model.Card.meaning,
+    card_model.Card.image_path,
+    card_model.Card.etymology,
+    card_model.Card.id,
+    card_model.Card.previous_answer_date,
+    card_model.Card.next_answer_date,
+    card_model.Card.retention_state,
+    card_model.Card.savings_score,
+    card_model.Card.updated_at,
+    card_model.Card.created_at,
+    card_model.Card.deck_id,
+]
 
 
 async def get_card(
@@ -33,28 +71,67 @@ async def get_card(
     return card
 
 
-async def get_cards(db: AsyncSession, deck_id: str) -> list[card_model.Card]:
+async def get_cards_version(
+    db: AsyncSession, deck_id: str, user_id: str
+) -> tuple[int, datetime | None]:
+    # 条件付き GET 用。デッキの所有者確認と同時にカードの件数・最終更新日時を集計する
+    Deck = deck_model.Deck
+    Card = card_model.Card
     stmt = (
-        select(deck_model.Deck)
-        .options(selectinload(deck_model.Deck.cards))
-        .filter_by(id=deck_id)
+        select(Deck.user_id, func.count(Card.id), func.max(Card.updated_at))
+        .outerjoin(Card, Card.deck_id == Deck.id)
+        .filter(Deck.id == deck_id)
+        .group_by(Deck.id, Deck.user_id)
     )
     result = await db.execute(stmt)
-    deck = result.scalar_one_or_none()
+    row = result.one_or_none()
+    deck_crud.verify_deck_owner(row[0] if row else None, user_id)
+    return row[1], row[2]
 
-    if not deck:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND, detail='Deck not found'
+
+async def get_cards(
+    db: AsyncSession,
+    deck_id: str,
+    limit: int | None = None,
+    cursor: str | None = None,
+) -> tuple[list[Row], str | None]:
+    # デッキの所有者は get_cards_version で確認済みであること
+    Card = card_model.Card
+    stmt = (
+        select(*CARD_RESPONSE_COLUMNS)
+        .filter(Card.deck_id == deck_id)
+        .order_by(Card.created_at, Card.id)
+    )
+
+    if cursor is not None:
+        created_at, card_id = decode_cursor(
+            cursor, datetime.fromisoformat, uuid.UUID
+        )
+        stmt = stmt.filter(
+            or_(
+                Card.created_at > created_at,
+                and_(Card.created_at == created_at, Card.id > card_id),
+            )
         )
-    return deck.cards
 
+    if limit is not None:
+        stmt = stmt.limit(limit + 1)
 
-async def get_answer_replay_cards(
-    db: AsyncSession, deck_id: str
-) -> list[card_model.Card]:
+    result = await db.execute(stmt)
+    cards = result.all()
+
+    next_cursor = None
+    if limit is not None and len(cards) > limit:
+        cards = cards[:limit]
+        next_cursor = encode_cursor(
+            cards[-1].created_at.isoformat(), cards[-1].id.hex
+        )
+    return cards, next_cursor
+
+
+async def get_answer_replay_cards(db: AsyncSession, deck_id: str) -> list[Row]:
     stmt = (
-        select(card_model.Card)
-        .join(card_model.Card.deck)
+        select(*CARD_RESPONSE_COLUMNS)
         .filter(card_model.Card.deck_id == deck_id)
         .filter(
             card_model.Card.next_answer_date
@@ -62,7 +139,48 @@ async def get_answer_replay_cards(
         )
     )
     result = await db.execute(stmt)
-    return result.scalars().all()
+    return result.all()
+
+
+async def get_review_queue(
+    db: AsyncSession,
+    user_id: str,
+    limit: int,
+    cursor: str | None = None,
+) -> tuple[list[Row], str | None]:
+    Card = card_model.Card
+    stmt = (
+        select(*CARD_RESPONSE_COLUMNS)
+        .filter(Card.user_id == user_id)
+        .filter(Card.next_answer_date < datetime.now(ZoneInfo('Asia/Tokyo')))
+        .order_by(Card.next_answer_date, Card.id)
+        .limit(limit + 1)
+    )
+
+    if cursor is not None:
+        next_answer_date, card_id = decode_cursor(
+            cursor, datetime.fromisoformat, uuid.UUID
+        )
+        stmt = stmt.filter(
+            or_(
+                Card.next_answer_date > next_answer_date,
+                and_(
+                    Card.next_answer_date == next_answer_date,
+                    Card.id > card_id,
+                ),
+            )
+        )
+
+    result = await db.execute(stmt)
+    cards = result.all()
+
+    next_cursor = None
+    if len(cards) > limit:
+        cards = cards[:limit]
+        next_cursor = encode_cursor(
+            cards[-1].next_answer_date.isoformat(), cards[-1].id.hex
+        )
+    return cards, next_cursor
 
 
 async def create_card(
@@ -71,7 +189,7 @@ async def create_card(
     deck_id: str,
     user_id: str,
 ):
-    user_settings = await user_crud.get_user_settings(db, user_id)
+    level_intervals = await user_crud.get_level_intervals(db, user_id)
     card = card_model.Card(
         sentence=form_data.sentence,
         meaning=form_data.meaning,
@@ -79,14 +197,114 @@ async def create_card(
         etymology=form_data.etymology,
         deck_id=deck_id,
         user_id=user_id,
-        next_answer_date=get_next_answer_date(user_settings.level_one),
+        next_answer_date=get_next_answer_date(level_intervals[0]),
     )
     db.add(card)
+    await deck_crud.increment_card_count(db, deck_id, 1)
+    due_increments = {}
+    add_due_increment(due_increments, deck_id, card.next_answer_date)
+    await deck_crud.increment_due_buckets(db, due_increments)
     await db.commit()
+    await deck_crud.invalidate_answer_replay_counts(user_id)
     await db.refresh(card)
     return card
 
 
+async def stream_cards(deck_id: str) -> AsyncIterator[list[Row]]:
+    Card = card_model.Card
+    stmt = (
+        select(*CARD_RESPONSE_COLUMNS)
+        .filter(Card.deck_id == deck_id)
+        .order_by(Card.created_at, Card.id)
+        .execution_options(yield_per=EXPORT_BATCH_SIZE)
+    )
+    async with async_session() as session:
+        result = await session.stream(stmt)
+        async for rows in result.partitions():
+            yield rows
+
+
+async def import_cards(
+    db: AsyncSession,
+    records: Iterator[tuple[int, dict | Exception]],
+    deck_id: str,
+    user_id: str,
+) -> card_schema.CardImportResult:
+    level_intervals = await user_crud.get_level_intervals(db, user_id)
+    next_answer_date = get_next_answer_date(level_intervals[0])
+
+    inserted = 0
+    failed = 0
+    errors = []
+    try:
+        while batch := await run_in_threadpool(
+            list, islice(records, IMPORT_BATCH_SIZE)
+        ):
+            cards = []
+            for row_number, record in batch:
+                try:
+                    if isinstance(record, Exception):
+                        raise record
+                    form_data = card_schema.CardCreate.model_validate(record)
+                except (ValueError, csv.Error) as e:
+                    failed += 1
+                    if len(errors) < IMPORT_MAX_ERRORS:
+                        errors.append(
+                            card_schema.CardImportError(
+                                row=row_number, detail=str(e)
+                            )
+                        )
+                    continue
+
+                cards.append(
+                    {
+                        'sentence': form_data.sentence,
+                        'meaning': form_data.meaning,
+                        'image_path': form_data.image_path,
+                        'etymology': form_data.etymology,
+                        'deck_id': deck_id,
+                        'user_id': user_id,
+                        'next_answer_date': next_answer_date,
+                    }
+                )
+
+            if cards:
+                await db.execute(insert(card_model.Card), cards)
+                await deck_crud.increment_card_count(db, deck_id, len(cards))
+                due_increments = {}
+                add_due_increment(
+                    due_increments, deck_id, next_answer_date, len(cards)
+                )
+                await deck_crud.increment_due_buckets(db, due_increments)
+                await db.commit()
+                inserted += len(cards)
+
+            logger.info(
+                'Importing cards into deck %s: %d inserted, %d failed',
+                deck_id,
+                inserted,
+                failed,
+            )
+    except Exception as e:
+        # コミット済みのバッチは残るため、どこまで取り込めたかを返す
+        logger.exception('Failed to import cards into deck %s', deck_id)
+        await db.rollback()
+        await deck_crud.invalidate_answer_replay_counts(user_id)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail={
+                'message': 'Import failed',
+                'inserted': inserted,
+                'failed': failed,
+            },
+        ) from e
+
+    await deck_crud.invalidate_answer_replay_counts(user_id)
+    return card_schema.CardImportResult(
+        inserted=inserted, failed=failed, errors=errors
+    )
+
+
 async def update_card(
     db: AsyncSession,
     form_data: card_schema.CardUpdate,
@@ -109,87 +327,267 @@ async def update_card_answer(
     card_id: str,
     user_id: str,
 ):
-    card = await get_card(db, card_id, user_id)
-    user_summary = await user_crud.get_user_summary(db, user_id)
-    current_saving_score = card.savings_score
+    Card = card_model.Card
+    UserSettings = user_model.UserSettings
+    # レベル別間隔も同じクエリで取得し、キャッシュの有無で文数が変わらないようにする
+    level_columns = user_crud.get_level_interval_columns()
+    stmt = (
+        select(
+            Card.user_id,
+            Card.deck_id,
+            Card.savings_score,
+            Card.previous_answer_date,
+            Card.next_answer_date,
+            *level_columns,
+        )
+        .outerjoin(UserSettings, UserSettings.user_id == user_id)
+        .filter(Card.id == card_id)
+    )
+    result = await db.execute(stmt)
+    row = result.one_or_none()
 
-    if form_data.is_correct and current_saving_score == 7:
-        card.retention_state = True
-        user_summary.level_seven_answers += 1
-        user_summary.level_seven_correct_answers += 1
-        await db.commit()
-        await db.refresh(card)
-        await db.refresh(user_summary)
-        return None
-
-    if form_data.is_correct:
-        next_savings_score = current_saving_score + 1
-        next_answer_date_delta_seconds = (
-            await user_crud.get_answer_date_from_saving_score(
-                db, user_id, current_saving_score
+    if not row:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail='Deck not found'
+        )
+
+    if row.user_id != user_id:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail='You are not authorized to deck.',
+        )
+
+    level_intervals = tuple(row[-len(level_columns) :])
+    card_values = get_next_card_state(
+        row.savings_score,
+        form_data.is_correct,
+        level_intervals,
+        get_answered_at(),
+        get_last_interval(row.previous_answer_date, row.next_answer_date),
+    )
+    await db.execute(
+        update(Card)
+        .where(Card.id == card_id)
+        .values(**card_values)
+        .execution_options(synchronize_session=False)
+    )
+
+    summary_increments = {}
+    add_summary_increment(
+        summary_increments, row.savings_score, form_data.is_correct
+    )
+    await user_crud.increment_level_stats(db, user_id, summary_increments)
+
+    if 'next_answer_date' in card_values:
+        due_increments = {}
+        add_due_increment(due_increments, row.deck_id, row.next_answer_date, -1)
+        add_due_increment(
+            due_increments, row.deck_id, card_values['next_answer_date']
+        )
+        await deck_crud.increment_due_buckets(db, due_increments)
+
+    await db.commit()
+    await deck_crud.invalidate_answer_replay_counts(user_id)
+    return None
+
+
+async def update_card_answers(
+    db: AsyncSession,
+    form_data: card_schema.CardAnswersRequest,
+    user_id: str,
+) -> list[card_schema.CardAnswerResult]:
+    if not form_data.answers:
+        return []
+
+    Card = card_model.Card
+    UserSettings = user_model.UserSettings
+    card_ids = {answer.card_id for answer in form_data.answers}
+    level_columns = user_crud.get_level_interval_columns()
+    stmt = (
+        select(
+            Card.id,
+            Card.user_id,
+            Card.deck_id,
+            Card.savings_score,
+            Card.retention_state,
+            Card.previous_answer_date,
+            Card.next_answer_date,
+            *level_columns,
+        )
+        .outerjoin(UserSettings, UserSettings.user_id == user_id)
+        .filter(Card.id.in_(card_ids))
+    )
+    result = await db.execute(stmt)
+    owners = {}
+    card_states = {}
+    last_intervals = {}
+    due_dates = {}
+    level_intervals = None
+    for row in result.all():
+        level_intervals = tuple(row[-len(level_columns) :])
+        owners[row.id] = row.user_id
+        card_states[row.id] = {
+            'savings_score': row.savings_score,
+            'retention_state': row.retention_state,
+            'previous_answer_date': row.previous_answer_date,
+            'next_answer_date': row.next_answer_date,
+        }
+        last_intervals[row.id] = get_last_interval(
+            row.previous_answer_date, row.next_answer_date
+        )
+        due_dates[row.id] = (row.deck_id, row.next_answer_date)
+
+    # 同じカードへの回答は順番に適用し、それ以外はまとめてスケジューラに渡す
+    results = [None] * len(form_data.answers)
+    rounds = []
+    occurrences = {}
+    for index, answer in enumerate(form_data.answers):
+        if answer.card_id not in owners:
+            results[index] = card_schema.CardAnswerResult(
+                card_id=answer.card_id, status='not_found'
             )
+            continue
+        if owners[answer.card_id] != user_id:
+            results[index] = card_schema.CardAnswerResult(
+                card_id=answer.card_id, status='forbidden'
+            )
+            continue
+
+        occurrence = occurrences.get(answer.card_id, 0)
+        occurrences[answer.card_id] = occurrence + 1
+        if occurrence == len(rounds):
+            rounds.append([])
+        rounds[occurrence].append(index)
+
+    # 全行のキーを揃えて1回の executemany にまとめるため、回答のあったカードは
+    # 現在の値を起点にスケジューラの結果を上書きしていく
+    scheduler = get_scheduler()
+    card_values = {}
+    summary_increments = {}
+    for indexes in rounds:
+        answers = [form_data.answers[index] for index in indexes]
+        next_states = scheduler.get_next_card_states(
+            [
+                card_states[answer.card_id]['savings_score']
+                for answer in answers
+            ],
+            [answer.is_correct for answer in answers],
+            [last_intervals[answer.card_id] for answer in answers],
+            level_intervals,
+            [get_answered_at(answer.answered_at) for answer in answers],
         )
-        card.savings_score = next_savings_score
-        card.next_answer_date = get_next_answer_date(
-            next_answer_date_delta_seconds
-        )
-
-        match current_saving_score:
-            case 1:
-                user_summary.level_one_answers += 1
-                user_summary.level_one_correct_answers += 1
-            case 2:
-                user_summary.level_two_answers += 1
-                user_summary.level_two_correct_answers += 1
-            case 3:
-                user_summary.level_three_answers += 1
-                user_summary.level_three_correct_answers += 1
-            case 4:
-                user_summary.level_four_answers += 1
-                user_summary.level_four_correct_answers += 1
-            case 5:
-                user_summary.level_five_answers += 1
-                user_summary.level_five_correct_answers += 1
-            case 6:
-                user_summary.level_six_answers += 1
-                user_summary.level_six_correct_answers += 1
-            case 7:
-                user_summary.level_seven_answers += 1
-                user_summary.level_seven_correct_answers += 1
-    else:
-        next_saving_score = 1
-        next_answer_date_delta_seconds = (
-            await user_crud.get_answer_date_from_saving_score(
-                db, user_id, next_saving_score
+
+        for index, answer, next_state in zip(indexes, answers, next_states):
+            values = card_states[answer.card_id]
+            add_summary_increment(
+                summary_increments, values['savings_score'], answer.is_correct
+            )
+
+            values.update(next_state)
+            card_values[answer.card_id] = values
+            if 'next_answer_date' in next_state:
+                last_intervals[answer.card_id] = get_last_interval(
+                    next_state['previous_answer_date'],
+                    next_state['next_answer_date'],
+                )
+            results[index] = card_schema.CardAnswerResult(
+                card_id=answer.card_id,
+                status='ok',
+                savings_score=values['savings_score'],
+                retention_state=values['retention_state'],
+                next_answer_date=values['next_answer_date'],
             )
+
+    if card_values:
+        await db.execute(
+            update(Card),
+            [
+                {'id': card_id, **values}
+                for card_id, values in card_values.items()
+            ],
         )
-        card.savings_score = next_saving_score
-        card.next_answer_date = get_next_answer_date(
-            next_answer_date_delta_seconds
-        )
-
-        match current_saving_score:
-            case 1:
-                user_summary.level_one_answers += 1
-            case 2:
-                user_summary.level_two_answers += 1
-            case 3:
-                user_summary.level_three_answers += 1
-            case 4:
-                user_summary.level_four_answers += 1
-            case 5:
-                user_summary.level_five_answers += 1
-            case 6:
-                user_summary.level_six_answers += 1
-            case 7:
-                user_summary.level_seven_answers += 1
+        await user_crud.increment_level_stats(db, user_id, summary_increments)
+
+        due_increments = {}
+        for card_id, values in card_values.items():
+            deck_id, next_answer_date = due_dates[card_id]
+            if values['next_answer_date'] == next_answer_date:
+                continue
+            add_due_increment(due_increments, deck_id, next_answer_date, -1)
+            add_due_increment(
+                due_increments, deck_id, values['next_answer_date']
+            )
+        await deck_crud.increment_due_buckets(db, due_increments)
+        await db.commit()
+
+    await deck_crud.invalidate_answer_replay_counts(user_id)
+    return results
+
 
+async def reschedule_cards(
+    db: AsyncSession, user_id: str, level_intervals: tuple[int, ...]
+) -> int:
+    Card = card_model.Card
+    reschedule_intervals = get_scheduler().get_reschedule_intervals(
+        level_intervals
+    )
+    interval = case(reschedule_intervals, value=Card.savings_score)
+    answered_at = func.coalesce(Card.previous_answer_date, Card.created_at)
+
+    # カード数によらず、カードの更新とヒストグラムの再構築の3文で済ませる
+    result = await db.execute(
+        update(Card)
+        .where(Card.user_id == user_id)
+        .where(Card.retention_state.is_(False))
+        .where(Card.savings_score.in_(reschedule_intervals))
+        .values(next_answer_date=add_seconds(db, answered_at, interval))
+        .execution_options(synchronize_session=False)
+    )
+    await db.run_sync(
+        lambda session: rebuild_due_buckets(
+            session.connection(), user_id=user_id
+        )
+    )
     await db.commit()
-    await db.refresh(card)
-    await db.refresh(user_summary)
-    return None
+
+    await deck_crud.invalidate_answer_replay_counts(user_id)
+    return result.rowcount
+
+
+def get_next_card_state(
+    savings_score: int,
+    is_correct: bool,
+    level_intervals: tuple[int, ...],
+    answered_at: datetime,
+    last_interval: float | None = None,
+) -> dict:
+    return get_scheduler().get_next_card_states(
+        [savings_score],
+        [is_correct],
+        [last_interval],
+        level_intervals,
+        [answered_at],
+    )[0]
+
+
+def add_summary_increment(
+    summary_increments: dict[int, list[int]],
+    savings_score: int,
+    is_correct: bool,
+):
+    level = min(max(savings_score, 1), len(level_and_score_mapping))
+    increments = summary_increments.setdefault(level, [0, 0])
+    increments[0] += 1
+    if is_correct:
+        increments[1] += 1
 
 
 async def delete_card(db: AsyncSession, card: card_model.Card):
+    user_id = card.user_id
     await db.delete(card)
+    await deck_crud.increment_card_count(db, card.deck_id, -1)
+    due_increments = {}
+    add_due_increment(due_increments, card.deck_id, card.next_answer_date, -1)
+    await deck_crud.increment_due_buckets(db, due_increments)
     await db.commit()
+    await deck_crud.invalidate_answer_replay_counts(user_id)
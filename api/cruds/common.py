@@ -1,5 +1,15 @@
 from typing import Type, TypeVar
 
+from sqlalchemy import (
+    DateTime,
+    Select,
+    String,
+    Table,
+    cast,
+    func,
+    literal_column,
+)
+from sqlalchemy.dialects import mysql, sqlite
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 
@@ -21,3 +31,71 @@ async def get_user_by_email(db: AsyncSession, email: str):
     stmt = select(user_model.User).filter_by(email=email)
     result = await db.execute(stmt)
     return result.scalar_one_or_none()
+
+
+def get_upsert_increment_stmt(
+    dialect: str,
+    table: Table,
+    values: list[dict] | Select,
+    increment_columns: list[str],
+):
+    # values は行の list か、挿入する列名をラベルに持つ SELECT
+    # 方言は api.db.create_engine で mysql か sqlite に限定している
+    if dialect == 'mysql':
+        stmt = mysql.insert(table)
+    else:
+        stmt = sqlite.insert(table)
+
+    if isinstance(values, Select):
+        stmt = stmt.from_select(
+            [column.name for column in values.selected_columns], values
+        )
+    else:
+        stmt = stmt.values(values)
+
+    if dialect == 'mysql':
+        return stmt.on_duplicate_key_update(
+            {
+                column: table.c[column] + stmt.inserted[column]
+                for column in increment_columns
+            }
+        )
+    return stmt.on_conflict_do_update(
+        index_elements=table.primary_key.columns,
+        set_={
+            column: table.c[column] + stmt.excluded[column]
+            for column in increment_columns
+        },
+    )
+
+
+async def upsert_increment(
+    db: AsyncSession,
+    table: Table,
+    rows: list[dict],
+    increment_columns: list[str],
+):
+    if not rows:
+        return
+
+    await db.execute(
+        get_upsert_increment_stmt(
+            db.get_bind().dialect.name, table, rows, increment_columns
+        )
+    )
+
+
+def add_seconds(db: AsyncSession, value, seconds):
+    if db.get_bind().dialect.name == 'mysql':
+        return func.timestampadd(literal_column('SECOND'), seconds, value)
+    # SQLAlchemy の SQLite DATETIME と同じ書式 (マイクロ秒6桁) で返す
+    modifier = '+' + seconds.cast(String) + ' seconds'
+    return func.strftime(
+        '%Y-%m-%d %H:%M:%f', value, modifier, type_=String
+    ).concat('000')
+
+
+def truncate_to_hour(dialect: str, value):
+    if dialect == 'mysql':
+        return cast(func.date_format(value, '%Y-%m-%d %H:00:00'), DateTime)
+    return func.strftime('%Y-%m-%d %H:00:00.000000', value, type_=String)
@@ -1,96 +1,165 @@
+import uuid
 from datetime import datetime
 from zoneinfo import ZoneInfo
 
-from sqlalchemy import func, case
+from sqlalchemy import func, update
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from sqlalchemy.orm import selectinload, aliased
 from fastapi import HTTPException, status
 
 import api.models.deck as deck_model
 import api.models.card as card_model
-import api.models.user as user_model
 import api.schemas.deck as deck_schema
-from api.cruds.common import get_model_by_id
+import api.utils.env as env
+from api.cruds.common import get_model_by_id, upsert_increment
+from api.cruds.user import get_user_cache_key
+from api.utils.cache import CacheNamespace, cached, invalidate
+from api.utils.deck_counters import get_due_bucket
+
+
+ANSWER_REPLAY_COUNTS_CACHE = CacheNamespace(
+    'answer_replay_counts',
+    env.DECK_COUNT_CACHE_TTL_SECONDS,
+    env.USER_CACHE_MAX_SIZE,
+    dict[uuid.UUID, int],
+)
 
 
 async def get_deck(
     db: AsyncSession, deck_id: str, user_id: str
 ) -> deck_model.Deck:
     deck = await get_model_by_id(db, deck_model.Deck, deck_id)
+    verify_deck_owner(deck.user_id if deck else None, user_id)
+    return deck
 
-    if not deck:
+
+def verify_deck_owner(deck_user_id: str | None, user_id: str):
+    if deck_user_id is None:
         raise HTTPException(status_code=404, detail='Deck not found')
 
-    if deck.user_id != user_id:
+    if deck_user_id != user_id:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail='You are not authorized to deck.',
         )
 
-    return deck
-
 
 async def get_decks(db: AsyncSession, user_id: str) -> list[deck_model.Deck]:
-    stmt = (
-        select(user_model.User)
-        .options(selectinload(user_model.User.decks))
-        .filter_by(id=user_id)
-    )
-    result = await db.execute(stmt)
-    user = result.scalar_one_or_none()
+    Deck = deck_model.Deck
+    result = await db.execute(select(Deck).filter(Deck.user_id == user_id))
+    return result.scalars().all()
 
-    if not user:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND, detail='User not found'
+
+async def get_decks_version(
+    db: AsyncSession, user_id: str
+) -> tuple[int, datetime | None]:
+    # 条件付き GET 用。デッキを読み込まずに件数と最終更新日時だけを集計する
+    Deck = deck_model.Deck
+    result = await db.execute(
+        select(func.count(Deck.id), func.max(Deck.updated_at)).filter(
+            Deck.user_id == user_id
         )
-    return user.decks
+    )
+    return tuple(result.one())
 
 
 async def get_decks_and_card_count(
     db: AsyncSession, user_id: str
 ) -> list[deck_schema.DeckWithCardCountModel]:
-    Deck = aliased(deck_model.Deck)
-    Card = aliased(card_model.Card)
+    Deck = deck_model.Deck
+    result = await db.execute(select(Deck).filter(Deck.user_id == user_id))
+    decks = result.scalars().all()
 
-    stmt = (
-        select(
-            Deck,
-            func.count(Card.id).label('card_count'),
-            func.count(
-                case(
-                    (
-                        Card.next_answer_date
-                        < datetime.now(ZoneInfo('Asia/Tokyo')),
-                        1,
-                    )
-                )
-            ).label('answer_replay_count'),
-        )
-        .join(Card, Deck.id == Card.deck_id, isouter=True)
-        .filter(Deck.user_id == user_id)
-        .group_by(Deck.id)
-    )
-
-    result = await db.execute(stmt)
-    decks_with_card_count = result.all()
-
-    if not decks_with_card_count:
+    if not decks:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail='User or Deck not found',
         )
 
+    answer_replay_counts = await get_answer_replay_counts(db, user_id)
     return [
         {
             'deck': deck,
-            'card_count': card_count,
-            'answer_replay_count': answer_replay_count,
+            'card_count': deck.card_count,
+            'answer_replay_count': answer_replay_counts.get(deck.id, 0),
         }
-        for deck, card_count, answer_replay_count in decks_with_card_count
+        for deck in decks
     ]
 
 
+@cached(
+    ANSWER_REPLAY_COUNTS_CACHE,
+    key=lambda db, user_id: get_user_cache_key(user_id),
+)
+async def get_answer_replay_counts(
+    db: AsyncSession, user_id: str
+) -> dict[uuid.UUID, int]:
+    # 時間の経過で増えるため TTL は短くし、回答・カードの増減時は無効化する
+    Deck = deck_model.Deck
+    DeckDueBucket = deck_model.DeckDueBucket
+    Card = card_model.Card
+
+    now = datetime.now(ZoneInfo('Asia/Tokyo')).replace(tzinfo=None)
+    current_bucket = get_due_bucket(now)
+
+    # 経過済みのバケットは集計値を合算し、現在のバケットだけカードを数える
+    stmt = (
+        select(DeckDueBucket.deck_id, func.sum(DeckDueBucket.card_count))
+        .join(Deck, Deck.id == DeckDueBucket.deck_id)
+        .filter(Deck.user_id == user_id)
+        .filter(DeckDueBucket.due_at < current_bucket)
+        .group_by(DeckDueBucket.deck_id)
+    )
+    result = await db.execute(stmt)
+    answer_replay_counts = dict(result.all())
+
+    stmt = (
+        select(Card.deck_id, func.count())
+        .filter(Card.user_id == user_id)
+        .filter(Card.next_answer_date >= current_bucket)
+        .filter(Card.next_answer_date < now)
+        .group_by(Card.deck_id)
+    )
+    result = await db.execute(stmt)
+    for deck_id, count in result.all():
+        answer_replay_counts[deck_id] = (
+            answer_replay_counts.get(deck_id, 0) + count
+        )
+    return answer_replay_counts
+
+
+async def invalidate_answer_replay_counts(user_id: uuid.UUID | str):
+    await invalidate(ANSWER_REPLAY_COUNTS_CACHE, get_user_cache_key(user_id))
+
+
+async def increment_card_count(db: AsyncSession, deck_id, card_count: int):
+    Deck = deck_model.Deck
+    await db.execute(
+        update(Deck)
+        .where(Deck.id == deck_id)
+        .values(
+            card_count=Deck.card_count + card_count,
+            updated_at=Deck.updated_at,
+        )
+        .execution_options(synchronize_session=False)
+    )
+
+
+async def increment_due_buckets(
+    db: AsyncSession, due_increments: dict[tuple, int]
+):
+    await upsert_increment(
+        db,
+        deck_model.DeckDueBucket.__table__,
+        [
+            {'deck_id': deck_id, 'due_at': due_at, 'card_count': card_count}
+            for (deck_id, due_at), card_count in due_increments.items()
+            if card_count
+        ],
+        ['card_count'],
+    )
+
+
 async def create_deck(
     db: AsyncSession, form_data: deck_schema.DeckCreate, user_id: str
 ):
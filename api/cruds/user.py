@@ -1,5 +1,6 @@
 import uuid
 
+from sqlalchemy import update
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from sqlalchemy.orm import selectinload
@@ -9,8 +10,32 @@ import api.models.user as user_model
 import api.schemas.auth as auth_schema
 import api.schemas.user as user_schema
 import api.utils.auth as auth_util
+import api.utils.env as env
 import api.utils.oblivion_curve as oblivion_curve_util
-from api.cruds.common import get_model_by_id, get_user_by_email
+from api.cruds.common import (
+    get_model_by_id,
+    get_user_by_email,
+    upsert_increment,
+)
+from api.utils.cache import CacheNamespace, cached, invalidate
+
+
+ACTIVE_USER_CACHE = CacheNamespace(
+    'active_user',
+    env.USER_CACHE_TTL_SECONDS,
+    env.USER_CACHE_MAX_SIZE,
+    user_schema.ActiveUser,
+)
+LEVEL_INTERVALS_CACHE = CacheNamespace(
+    'level_intervals',
+    env.SETTINGS_CACHE_TTL_SECONDS,
+    env.USER_CACHE_MAX_SIZE,
+    tuple[int, ...],
+)
+
+
+def get_user_cache_key(user_id: uuid.UUID | str) -> str:
+    return uuid.UUID(str(user_id)).hex
 
 
 async def get_user(db: AsyncSession, user_id: str) -> user_model.User:
@@ -18,6 +43,24 @@ async def get_user(db: AsyncSession, user_id: str) -> user_model.User:
     return user
 
 
+@cached(
+    ACTIVE_USER_CACHE,
+    key=lambda db, user_id: get_user_cache_key(user_id),
+    condition=lambda user: user is not None and user.is_active,
+)
+async def get_active_user(
+    db: AsyncSession, user_id: str
+) -> user_schema.ActiveUser | None:
+    user = await get_user(db, user_id)
+    if user is None:
+        return None
+    return user_schema.ActiveUser.model_validate(user)
+
+
+async def invalidate_active_user(user_id: uuid.UUID | str):
+    await invalidate(ACTIVE_USER_CACHE, get_user_cache_key(user_id))
+
+
 async def create_user(
     db: AsyncSession, form_data: auth_schema.SignupRequestForm
 ) -> user_model.User:
@@ -30,7 +73,7 @@ async def create_user(
     user = user_model.User(
         username=form_data.username,
         email=form_data.email,
-        password=auth_util.get_password_hash(form_data.password),
+        password=await auth_util.get_password_hash_async(form_data.password),
     )
 
     async with db:
@@ -71,10 +114,16 @@ async def update_user_state(
             status_code=status.HTTP_404_NOT_FOUND, detail='User not found'
         )
 
+    return await activate_user(db, user)
+
+
+async def activate_user(
+    db: AsyncSession, user: user_model.User
+) -> user_model.User:
     user.is_active = True
     await db.commit()
     await db.refresh(user)
-
+    await invalidate_active_user(user.id)
     return user
 
 
@@ -87,7 +136,9 @@ async def authenticate_user(
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail='User not found'
         )
-    if not auth_util.verify_password(form_data.password, user.password):
+    if not await auth_util.verify_password_async(
+        form_data.password, user.password
+    ):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail='Incorrect username or password',
@@ -104,15 +155,35 @@ async def is_email_registered(db: AsyncSession, email: str) -> bool:
 async def get_user_settings(
     db: AsyncSession, user_id: str
 ) -> user_model.UserSettings:
-    stmt = (
-        select(user_model.User)
-        .options(selectinload(user_model.User.user_settings))
-        .filter_by(id=user_id)
+    UserSettings = user_model.UserSettings
+    stmt = select(UserSettings).filter(UserSettings.user_id == user_id)
+    result = await db.execute(stmt)
+    return result.scalar_one_or_none()
+
+
+def get_level_interval_columns() -> list:
+    return [
+        getattr(user_model.UserSettings, level)
+        for level in oblivion_curve_util.level_and_score_mapping.values()
+    ]
+
+
+@cached(
+    LEVEL_INTERVALS_CACHE, key=lambda db, user_id: get_user_cache_key(user_id)
+)
+async def get_level_intervals(
+    db: AsyncSession, user_id: str
+) -> tuple[int, ...]:
+    UserSettings = user_model.UserSettings
+    stmt = select(*get_level_interval_columns()).filter(
+        UserSettings.user_id == user_id
     )
     result = await db.execute(stmt)
-    user = result.scalar_one_or_none()
+    return tuple(result.one())
+
 
-    return user.user_settings
+async def invalidate_level_intervals(user_id: uuid.UUID | str):
+    await invalidate(LEVEL_INTERVALS_CACHE, get_user_cache_key(user_id))
 
 
 async def get_user_summary(
@@ -132,86 +203,76 @@ async def get_user_summary(
 async def get_answer_date_from_saving_score(
     db: AsyncSession, user_id: str, saving_score: int
 ) -> int:
-    user_settings = await get_user_settings(db, user_id)
-
-    level_mapping = {
-        1: user_settings.level_one,
-        2: user_settings.level_two,
-        3: user_settings.level_three,
-        4: user_settings.level_four,
-        5: user_settings.level_five,
-        6: user_settings.level_six,
-    }
-    return level_mapping.get(saving_score, user_settings.level_seven)
+    level_intervals = await get_level_intervals(db, user_id)
+    return oblivion_curve_util.get_interval_for_score(
+        level_intervals, saving_score
+    )
 
 
-async def get_user_summary_update_level(
-    user_summary: user_model.UserSummary, saving_score: int
+async def increment_level_stats(
+    db: AsyncSession, user_id: str, level_increments: dict[int, list[int]]
 ):
-    user_summary_update_level_mapping = {
-        1: [
-            user_summary.level_one_answers,
-            user_summary.level_one_correct_answers,
-        ],
-        2: [
-            user_summary.level_two_answers,
-            user_summary.level_two_correct_answers,
-        ],
-        3: [
-            user_summary.level_three_answers,
-            user_summary.level_three_correct_answers,
-        ],
-        4: [
-            user_summary.level_four_answers,
-            user_summary.level_four_correct_answers,
-        ],
-        5: [
-            user_summary.level_five_answers,
-            user_summary.level_five_correct_answers,
+    await upsert_increment(
+        db,
+        user_model.UserLevelStat.__table__,
+        [
+            {
+                'user_id': user_id,
+                'level': level,
+                'answers': answers,
+                'correct_answers': correct_answers,
+            }
+            for level, (answers, correct_answers) in level_increments.items()
         ],
-        6: [
-            user_summary.level_six_answers,
-            user_summary.level_six_correct_answers,
-        ],
-        7: [
-            user_summary.level_seven_answers,
-            user_summary.level_seven_correct_answers,
-        ],
-    }
-
-    return user_summary_update_level_mapping.get(saving_score)
+        ['answers', 'correct_answers'],
+    )
 
 
-async def update_user_settings(
-    db: AsyncSession, user_id: str, form_data: user_schema.UserSettingsRequest
-):
-    stmt = (
-        select(user_model.User)
-        .options(selectinload(user_model.User.user_settings))
-        .filter_by(id=user_id)
-    )
+async def get_level_stats(
+    db: AsyncSession, user_id: str
+) -> list[user_schema.UserLevelStatResponse]:
+    UserLevelStat = user_model.UserLevelStat
+    stmt = select(
+        UserLevelStat.level,
+        UserLevelStat.answers,
+        UserLevelStat.correct_answers,
+    ).filter(UserLevelStat.user_id == user_id)
     result = await db.execute(stmt)
-    user = result.scalar_one_or_none()
-    user_settings = user.user_settings
-
-    levels = [
-        'level_one',
-        'level_two',
-        'level_three',
-        'level_four',
-        'level_five',
-        'level_six',
-        'level_seven',
+    level_stats = {row.level: row for row in result.all()}
+
+    return [
+        user_schema.UserLevelStatResponse(
+            level=level,
+            answers=level_stats[level].answers if level in level_stats else 0,
+            correct_answers=(
+                level_stats[level].correct_answers
+                if level in level_stats
+                else 0
+            ),
+        )
+        for level in oblivion_curve_util.level_and_score_mapping
     ]
 
-    for level in levels:
+
+async def update_user_settings(
+    db: AsyncSession, user_id: str, form_data: user_schema.UserSettingsRequest
+) -> tuple[int, ...]:
+    UserSettings = user_model.UserSettings
+    values = {}
+    for level in oblivion_curve_util.level_and_score_mapping.values():
         oblivion_curve_date = getattr(form_data, level)
-        result = oblivion_curve_util.get_next_answer_date_delta_seconds(
+        values[level] = oblivion_curve_util.get_next_answer_date_delta_seconds(
             oblivion_curve_date['month'],
             oblivion_curve_date['day'],
             oblivion_curve_date['hour'],
         )
-        setattr(user_settings, level, result)
 
+    await db.execute(
+        update(UserSettings)
+        .where(UserSettings.user_id == user_id)
+        .values(**values)
+        .execution_options(synchronize_session=False)
+    )
     await db.commit()
-    await db.refresh(user_settings)
+    await invalidate_level_intervals(user_id)
+    return tuple(values.values())
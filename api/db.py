@@ -1,17 +1,284 @@
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
-from sqlalchemy.orm import sessionmaker, declarative_base
+import asyncio
+import logging
+import random
+import time
+
+from sqlalchemy import event
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import (
+    AsyncEngine,
+    AsyncSession,
+    create_async_engine,
+)
+from sqlalchemy.orm import Session, sessionmaker, declarative_base
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 
 import api.utils.env as env
+from api.utils.cache import CacheNamespace, get_cache_backend
+from api.utils.metrics import Counter, Histogram
+
+
+logger = logging.getLogger(__name__)
 
 DB_URL = env.DB_URL
-async_engine = create_async_engine(DB_URL, echo=True)
+
+pool_checkout_wait = Histogram()
+pool_checkout_timeouts = Counter()
+
+
+class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            pool_checkout_timeouts.inc()
+            raise
+        finally:
+            pool_checkout_wait.observe(time.perf_counter() - started)
+
+
+# upsert や日時計算の SQL はこの方言ごとに組み立てる (api.cruds.common)
+SUPPORTED_DIALECTS = ('mysql', 'sqlite')
+
+
+def create_engine(url: str) -> AsyncEngine:
+    engine = create_async_engine(
+        url,
+        echo=env.DB_ECHO,
+        poolclass=InstrumentedQueuePool,
+        pool_size=env.DB_POOL_SIZE,
+        max_overflow=env.DB_MAX_OVERFLOW,
+        pool_recycle=env.DB_POOL_RECYCLE,
+        pool_pre_ping=env.DB_POOL_PRE_PING,
+        pool_timeout=env.DB_POOL_TIMEOUT,
+    )
+    dialect = engine.dialect.name
+    if dialect not in SUPPORTED_DIALECTS:
+        raise ValueError(f'Unsupported database dialect: {dialect}')
+    return engine
+
+
+class PrimarySession(Session):
+    pass
+
+
+class PrimaryAsyncSession(AsyncSession):
+    async def commit(self):
+        await super().commit()
+        # レスポンスを返す前に印を付け、次のリクエストからプライマリを読ませる
+        user_id = self.info.get('user_id')
+        if self.info.pop('committed_writes', False) and user_id is not None:
+            await mark_recent_write(user_id)
+
+
+async_engine = create_engine(DB_URL)
 async_session = sessionmaker(
-    autocommit=False, autoflush=False, bind=async_engine, class_=AsyncSession
+    autocommit=False,
+    autoflush=False,
+    bind=async_engine,
+    class_=PrimaryAsyncSession,
+    sync_session_class=PrimarySession,
 )
 
 Base = declarative_base()
 
 
+# 書き込んだユーザーの印。どのワーカーからも見えるようキャッシュに置き、TTL で消す
+RECENT_WRITES_CACHE = CacheNamespace(
+    'recent_writes',
+    env.DB_READ_YOUR_WRITES_SECONDS,
+    env.USER_CACHE_MAX_SIZE,
+    bool,
+)
+
+
 async def get_db():
     async with async_session() as session:
         yield session
+
+
+def set_session_user(session: AsyncSession, user_id):
+    session.info['user_id'] = user_id
+
+
+def get_recent_write_key(user_id) -> str:
+    return str(user_id)
+
+
+async def mark_recent_write(user_id):
+    if replica_router.replicas:
+        await get_cache_backend().set(
+            RECENT_WRITES_CACHE, get_recent_write_key(user_id), True
+        )
+
+
+async def has_recent_write(user_id) -> bool:
+    return bool(
+        await get_cache_backend().get(
+            RECENT_WRITES_CACHE, get_recent_write_key(user_id)
+        )
+    )
+
+
+@event.listens_for(PrimarySession, 'after_flush')
+def mark_flushed(session, flush_context):
+    session.info['has_writes'] = True
+
+
+@event.listens_for(PrimarySession, 'do_orm_execute')
+def mark_executed(orm_execute_state):
+    # session.execute(update(...)) などフラッシュを経由しない書き込み
+    if not orm_execute_state.is_select:
+        orm_execute_state.session.info['has_writes'] = True
+
+
+@event.listens_for(PrimarySession, 'after_commit')
+def remember_writer(session):
+    if session.info.pop('has_writes', False):
+        session.info['committed_writes'] = True
+
+
+@event.listens_for(PrimarySession, 'after_rollback')
+def forget_writes(session):
+    session.info.pop('has_writes', None)
+
+
+class Replica:
+    def __init__(self, url: str):
+        self.engine = create_engine(url)
+        self.session = sessionmaker(
+            autocommit=False,
+            autoflush=False,
+            bind=self.engine,
+            class_=AsyncSession,
+        )
+        self.lag_seconds: float | None = None  # None は未計測または異常
+
+    @property
+    def url(self) -> str:
+        return self.engine.url.render_as_string(hide_password=True)
+
+    async def check_lag(self):
+        try:
+            self.lag_seconds = await get_replication_lag(self.engine)
+        except Exception:
+            logger.exception('Failed to check replica lag of %s', self.url)
+            self.lag_seconds = None
+
+
+async def get_replication_lag(engine: AsyncEngine) -> float | None:
+    async with engine.connect() as connection:
+        if connection.dialect.name != 'mysql':
+            return 0.0
+        result = await connection.exec_driver_sql('SHOW REPLICA STATUS')
+        row = result.mappings().first()
+    if row is None:
+        # レプリケーションが設定されていない (開発環境でプライマリを指している等)
+        return 0.0
+    lag = row['Seconds_Behind_Source']
+    return None if lag is None else float(lag)
+
+
+class ReplicaRouter:
+    def __init__(
+        self,
+        urls: list[str],
+        max_lag_seconds: float,
+        check_interval: float,
+    ):
+        self.replicas = [Replica(url) for url in urls]
+        self.max_lag_seconds = max_lag_seconds
+        self.check_interval = check_interval
+        self.task: asyncio.Task | None = None
+        self.primary_reads = Counter()
+        self.replica_reads = Counter()
+        self.sticky_reads = Counter()
+
+    def start(self):
+        if not self.replicas:
+            return
+        if env.CACHE_BACKEND == 'local':
+            logger.warning(
+                'Read-your-writes is tracked per worker with the local cache '
+                'backend; use CACHE_BACKEND=redis with multiple workers'
+            )
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self.task is None:
+            return
+        self.task.cancel()
+        try:
+            await self.task
+        except asyncio.CancelledError:
+            pass
+        self.task = None
+        for replica in self.replicas:
+            await replica.engine.dispose()
+
+    async def run(self):
+        while True:
+            await asyncio.gather(
+                *[replica.check_lag() for replica in self.replicas]
+            )
+            await asyncio.sleep(self.check_interval)
+
+    def get_available_replicas(self) -> list[Replica]:
+        return [
+            replica
+            for replica in self.replicas
+            if replica.lag_seconds is not None
+            and replica.lag_seconds <= self.max_lag_seconds
+        ]
+
+    async def get_read_session(self, user_id=None) -> sessionmaker:
+        # 直近に書き込んだユーザーと、遅延が許容範囲のレプリカがない場合はプライマリ
+        replicas = self.get_available_replicas()
+        if not replicas:
+            self.primary_reads.inc()
+            return async_session
+        if user_id is not None and await has_recent_write(user_id):
+            self.primary_reads.inc()
+            self.sticky_reads.inc()
+            return async_session
+        self.replica_reads.inc()
+        return random.choice(replicas).session
+
+    def stats(self) -> dict:
+        return {
+            'replicas': [
+                {
+                    'url': replica.url,
+                    'lag_seconds': replica.lag_seconds,
+                    'available': replica in self.get_available_replicas(),
+                    'checked_out': replica.engine.pool.checkedout(),
+                }
+                for replica in self.replicas
+            ],
+            'max_lag_seconds': self.max_lag_seconds,
+            'primary_reads': self.primary_reads.value,
+            'replica_reads': self.replica_reads.value,
+            'sticky_reads': self.sticky_reads.value,
+        }
+
+
+replica_router = ReplicaRouter(
+    env.DB_REPLICA_URLS,
+    env.DB_REPLICA_MAX_LAG_SECONDS,
+    env.DB_REPLICA_LAG_CHECK_INTERVAL,
+)
+
+
+def get_pool_stats() -> dict:
+    pool = async_engine.pool
+    return {
+        'pool_size': pool.size(),
+        'max_overflow': env.DB_MAX_OVERFLOW,
+        'checked_in': pool.checkedin(),
+        'checked_out': pool.checkedout(),
+        'overflow': max(pool.overflow(), 0),
+        'checkout_timeouts': pool_checkout_timeouts.value,
+        'checkout_wait_seconds': pool_checkout_wait.snapshot(),
+    }
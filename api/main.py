@@ -1,3 +1,5 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
@@ -5,8 +7,34 @@ from api.routers import auth
 from api.routers import user
 from api.routers import deck
 from api.routers import card
+from api.routers import internal
+from api.db import async_engine, replica_router
+import api.utils.env as env
+from api.utils.cache import get_cache_backend
+from api.utils.deck_counters import DueBucketCompactor
+from api.utils.mail import mail_dispatcher
+from api.utils.profiling import ProfilingMiddleware, instrument_engine
+
+
+due_bucket_compactor = DueBucketCompactor(
+    async_engine, env.DUE_BUCKET_COMPACT_INTERVAL_SECONDS
+)
+
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    mail_dispatcher.start()
+    replica_router.start()
+    get_cache_backend().start()
+    due_bucket_compactor.start()
+    yield
+    await due_bucket_compactor.stop()
+    await get_cache_backend().stop()
+    await replica_router.stop()
+    await mail_dispatcher.stop()
+
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -14,9 +42,18 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=['*'],
     allow_headers=['*'],
+    # ブラウザの JavaScript からページングのカーソルと検証子を読めるようにする
+    expose_headers=['X-Next-Cursor', 'ETag', 'Last-Modified'],
+)
+app.add_middleware(
+    ProfilingMiddleware, slow_request_seconds=env.SLOW_REQUEST_SECONDS
 )
+instrument_engine(async_engine)
+for replica in replica_router.replicas:
+    instrument_engine(replica.engine)
 
 app.include_router(auth.router)
 app.include_router(user.router)
 app.include_router(deck.router)
 app.include_router(card.router)
+app.include_router(internal.router)
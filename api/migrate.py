@@ -1,26 +1,119 @@
-from sqlalchemy import create_engine
+import argparse
+import importlib
+import pkgutil
 
+from sqlalchemy import (
+    create_engine,
+    Column,
+    MetaData,
+    String,
+    Table,
+    TIMESTAMP,
+    insert,
+    select,
+)
+from sqlalchemy.engine import Connection
+from sqlalchemy.sql import func
+
+import api.migrations as migrations
+import api.utils.env as env
 from api.models.user import Base as user_base
 from api.models.auth import Base as auth_base
 from api.models.deck import Base as deck_base
 from api.models.card import Base as card_base
 
 
-DB_URL = 'mysql+pymysql://root@db:3306/app?charset=utf8'
+DB_URL = env.MIGRATE_DB_URL
 engine = create_engine(DB_URL, echo=True)
 
+migration_metadata = MetaData()
+schema_migrations = Table(
+    'schema_migrations',
+    migration_metadata,
+    Column('version', String(32), primary_key=True),
+    Column('name', String(255)),
+    Column('applied_at', TIMESTAMP, server_default=func.now()),
+)
+
+
+def load_migrations():
+    modules = [
+        importlib.import_module(f'{migrations.__name__}.{module.name}')
+        for module in pkgutil.iter_modules(migrations.__path__)
+    ]
+    return sorted(modules, key=lambda module: module.VERSION)
+
+
+def get_applied_versions(connection: Connection) -> set[str]:
+    result = connection.execute(select(schema_migrations.c.version))
+    return set(result.scalars().all())
+
+
+def mark_applied(connection: Connection, migration):
+    connection.execute(
+        insert(schema_migrations).values(
+            version=migration.VERSION, name=migration.NAME
+        )
+    )
+
+
+def upgrade():
+    migration_metadata.create_all(bind=engine)
+    with engine.connect() as connection:
+        applied_versions = get_applied_versions(connection)
+
+    for migration in load_migrations():
+        if migration.VERSION in applied_versions:
+            continue
+        with engine.begin() as connection:
+            migration.upgrade(connection)
+            mark_applied(connection, migration)
+
+
+def status():
+    migration_metadata.create_all(bind=engine)
+    with engine.connect() as connection:
+        applied_versions = get_applied_versions(connection)
+
+    for migration in load_migrations():
+        state = (
+            'applied' if migration.VERSION in applied_versions else 'pending'
+        )
+        print(f'{migration.VERSION} {migration.NAME}: {state}')
+
 
 def reset_database():
     user_base.metadata.drop_all(bind=engine)
     auth_base.metadata.drop_all(bind=engine)
     deck_base.metadata.drop_all(bind=engine)
     card_base.metadata.drop_all(bind=engine)
+    migration_metadata.drop_all(bind=engine)
 
     user_base.metadata.create_all(bind=engine)
     auth_base.metadata.create_all(bind=engine)
     deck_base.metadata.create_all(bind=engine)
     card_base.metadata.create_all(bind=engine)
+    migration_metadata.create_all(bind=engine)
+
+    with engine.begin() as connection:
+        for migration in load_migrations():
+            mark_applied(connection, migration)
 
 
 if __name__ == '__main__':
-    reset_database()
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        'command',
+        nargs='?',
+        default='upgrade',
+        choices=['upgrade', 'status', 'reset'],
+    )
+    args = parser.parse_args()
+
+    match args.command:
+        case 'upgrade':
+            upgrade()
+        case 'status':
+            status()
+        case 'reset':
+            reset_database()
@@ -0,0 +1,28 @@
+from sqlalchemy import Table, inspect
+from sqlalchemy.engine import Connection
+
+
+def has_table(connection: Connection, table_name: str) -> bool:
+    return inspect(connection).has_table(table_name)
+
+
+def has_column(
+    connection: Connection, table_name: str, column_name: str
+) -> bool:
+    columns = inspect(connection).get_columns(table_name)
+    return any(column['name'] == column_name for column in columns)
+
+
+def has_index(connection: Connection, table_name: str, index_name: str) -> bool:
+    indexes = inspect(connection).get_indexes(table_name)
+    return any(index['name'] == index_name for index in indexes)
+
+
+def create_indexes(
+    connection: Connection, table: Table, index_names: list[str]
+):
+    for index in table.indexes:
+        if index.name in index_names and not has_index(
+            connection, table.name, index.name
+        ):
+            index.create(bind=connection)
@@ -0,0 +1,28 @@
+from sqlalchemy.engine import Connection
+
+from api.db import Base
+import api.models.user  # noqa: F401
+import api.models.auth  # noqa: F401
+import api.models.deck  # noqa: F401
+import api.models.card  # noqa: F401
+
+
+VERSION = '0001'
+NAME = 'initial_schema'
+
+TABLES = [
+    'users',
+    'verifications',
+    'decks',
+    'cards',
+    'user_settings',
+    'user_summaries',
+]
+
+
+def upgrade(connection: Connection):
+    Base.metadata.create_all(
+        bind=connection,
+        tables=[Base.metadata.tables[name] for name in TABLES],
+        checkfirst=True,
+    )
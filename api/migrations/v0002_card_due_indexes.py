@@ -0,0 +1,18 @@
+from sqlalchemy.engine import Connection
+
+from api.db import Base
+from api.migrations import create_indexes
+import api.models.card  # noqa: F401
+
+
+VERSION = '0002'
+NAME = 'card_due_indexes'
+
+INDEXES = [
+    'ix_cards_deck_id_next_answer_date',
+    'ix_cards_user_id_next_answer_date',
+]
+
+
+def upgrade(connection: Connection):
+    create_indexes(connection, Base.metadata.tables['cards'], INDEXES)
@@ -0,0 +1,15 @@
+from sqlalchemy.engine import Connection
+
+from api.db import Base
+from api.migrations import create_indexes
+import api.models.card  # noqa: F401
+
+
+VERSION = '0003'
+NAME = 'card_listing_index'
+
+INDEXES = ['ix_cards_deck_id_created_at_id']
+
+
+def upgrade(connection: Connection):
+    create_indexes(connection, Base.metadata.tables['cards'], INDEXES)
@@ -0,0 +1,40 @@
+from sqlalchemy import and_, exists, insert, literal, select
+from sqlalchemy.engine import Connection
+
+from api.db import Base
+from api.migrations import has_table
+import api.models.user  # noqa: F401
+from api.utils.oblivion_curve import level_and_score_mapping
+
+
+VERSION = '0004'
+NAME = 'user_level_stats'
+
+
+def upgrade(connection: Connection):
+    user_level_stats = Base.metadata.tables['user_level_stats']
+    user_summaries = Base.metadata.tables['user_summaries']
+
+    if not has_table(connection, 'user_level_stats'):
+        user_level_stats.create(bind=connection)
+
+    for level, level_name in level_and_score_mapping.items():
+        answers = user_summaries.c[f'{level_name}_answers']
+        correct_answers = user_summaries.c[f'{level_name}_correct_answers']
+        already_migrated = exists().where(
+            and_(
+                user_level_stats.c.user_id == user_summaries.c.user_id,
+                user_level_stats.c.level == level,
+            )
+        )
+        connection.execute(
+            insert(user_level_stats).from_select(
+                ['user_id', 'level', 'answers', 'correct_answers'],
+                select(
+                    user_summaries.c.user_id,
+                    literal(level),
+                    answers,
+                    correct_answers,
+                ).where(answers > 0, ~already_migrated),
+            )
+        )
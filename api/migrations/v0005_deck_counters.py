@@ -0,0 +1,27 @@
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+from api.db import Base
+from api.migrations import has_column, has_table
+import api.models.deck  # noqa: F401
+import api.models.card  # noqa: F401
+from api.utils.deck_counters import rebuild_deck_counters
+
+
+VERSION = '0005'
+NAME = 'deck_counters'
+
+
+def upgrade(connection: Connection):
+    if not has_column(connection, 'decks', 'card_count'):
+        connection.execute(
+            text(
+                'ALTER TABLE decks '
+                'ADD COLUMN card_count INTEGER NOT NULL DEFAULT 0'
+            )
+        )
+
+    if not has_table(connection, 'deck_due_buckets'):
+        Base.metadata.tables['deck_due_buckets'].create(bind=connection)
+
+    rebuild_deck_counters(connection)
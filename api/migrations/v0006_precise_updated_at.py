@@ -0,0 +1,21 @@
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+
+VERSION = '0006'
+NAME = 'precise_updated_at'
+
+TABLES = ['cards', 'decks']
+
+
+def upgrade(connection: Connection):
+    # SQLite は日時を文字列で持つため、秒未満もそのまま保存できる
+    if connection.dialect.name != 'mysql':
+        return
+    for table in TABLES:
+        connection.execute(
+            text(
+                f'ALTER TABLE {table} MODIFY updated_at TIMESTAMP(6) '
+                'NOT NULL DEFAULT CURRENT_TIMESTAMP(6)'
+            )
+        )
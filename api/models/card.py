@@ -1,12 +1,13 @@
 import uuid
 from datetime import datetime
 
-from sqlalchemy import String, Boolean, Integer, TIMESTAMP, ForeignKey
+from sqlalchemy import String, Boolean, Integer, TIMESTAMP, ForeignKey, Index
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from sqlalchemy_utils import UUIDType
 from sqlalchemy.sql import func
 
 from api.db import Base
+from api.models.common import PreciseTimestamp, precise_now
 
 
 class Card(Base):
@@ -29,7 +30,7 @@ class Card(Base):
     savings_score: Mapped[int] = mapped_column(Integer, default=1)
 
     updated_at: Mapped[datetime] = mapped_column(
-        TIMESTAMP, server_default=func.now(), onupdate=func.current_timestamp()
+        PreciseTimestamp, server_default=precise_now(), onupdate=precise_now()
     )
     created_at: Mapped[datetime] = mapped_column(
         TIMESTAMP, server_default=func.now()
@@ -40,3 +41,13 @@ class Card(Base):
 
     user_id: Mapped[uuid.UUID] = mapped_column(ForeignKey('users.id'))
     user: Mapped['User'] = relationship(back_populates='cards')
+
+    __table_args__ = (
+        Index(
+            'ix_cards_deck_id_next_answer_date', 'deck_id', 'next_answer_date'
+        ),
+        Index(
+            'ix_cards_user_id_next_answer_date', 'user_id', 'next_answer_date'
+        ),
+        Index('ix_cards_deck_id_created_at_id', 'deck_id', 'created_at', 'id'),
+    )
@@ -0,0 +1,25 @@
+from sqlalchemy import TIMESTAMP
+from sqlalchemy.dialects import mysql
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.functions import FunctionElement
+
+
+# 条件付き GET の ETag に使うため、同じ秒に更新されても値が変わるよう
+# マイクロ秒まで保持する (MySQL の TIMESTAMP は既定で秒単位)
+PreciseTimestamp = TIMESTAMP().with_variant(mysql.TIMESTAMP(fsp=6), 'mysql')
+
+
+class precise_now(FunctionElement):
+    type = TIMESTAMP()
+    inherit_cache = True
+
+
+@compiles(precise_now)
+def compile_precise_now(element, compiler, **kw):
+    # SQLAlchemy の SQLite DATETIME と同じ書式 (マイクロ秒6桁) で返す
+    return "(strftime('%Y-%m-%d %H:%M:%f', 'now') || '000')"
+
+
+@compiles(precise_now, 'mysql')
+def compile_precise_now_mysql(element, compiler, **kw):
+    return 'CURRENT_TIMESTAMP(6)'
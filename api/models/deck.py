@@ -2,12 +2,13 @@ import uuid
 from datetime import datetime
 from typing import List
 
-from sqlalchemy import String, TIMESTAMP, ForeignKey
+from sqlalchemy import String, Integer, DateTime, TIMESTAMP, ForeignKey
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from sqlalchemy_utils import UUIDType
 from sqlalchemy.sql import func
 
 from api.db import Base
+from api.models.common import PreciseTimestamp, precise_now
 
 
 class Deck(Base):
@@ -17,8 +18,11 @@ class Deck(Base):
         UUIDType(binary=False), primary_key=True, default=uuid.uuid4
     )
     name: Mapped[str] = mapped_column(String(1024))
+    card_count: Mapped[int] = mapped_column(
+        Integer, default=0, server_default='0'
+    )  # カード枚数
     updated_at: Mapped[datetime] = mapped_column(
-        TIMESTAMP, server_default=func.now(), onupdate=func.current_timestamp()
+        PreciseTimestamp, server_default=precise_now(), onupdate=precise_now()
     )
     created_at: Mapped[datetime] = mapped_column(
         TIMESTAMP, server_default=func.now()
@@ -30,3 +34,21 @@ class Deck(Base):
     cards: Mapped[List['Card']] = relationship(
         back_populates='deck', cascade='all, delete-orphan'
     )
+
+    due_buckets: Mapped[List['DeckDueBucket']] = relationship(
+        back_populates='deck', cascade='all, delete-orphan'
+    )
+
+
+class DeckDueBucket(Base):
+    __tablename__ = 'deck_due_buckets'
+
+    deck_id: Mapped[uuid.UUID] = mapped_column(
+        ForeignKey('decks.id'), primary_key=True
+    )
+    due_at: Mapped[datetime] = mapped_column(
+        DateTime, primary_key=True
+    )  # 出題日時 (1時間単位で切り捨て)
+    card_count: Mapped[int] = mapped_column(Integer, default=0)
+
+    deck: Mapped['Deck'] = relationship(back_populates='due_buckets')
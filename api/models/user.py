@@ -44,6 +44,10 @@ class User(Base):
         back_populates='user', cascade='all, delete-orphan'
     )
 
+    user_level_stats: Mapped[List['UserLevelStat']] = relationship(
+        back_populates='user', cascade='all, delete-orphan'
+    )
+
 
 class UserSettings(Base):
     __tablename__ = 'user_settings'
@@ -77,6 +81,7 @@ class UserSummary(Base):
         Integer, default=1
     )  # 連続ログイン日数
 
+    # レベル別の回答数・正答数は user_level_stats に移行済み (旧カラムは更新しない)
     level_one_answers: Mapped[int] = mapped_column(Integer, default=0)  # 回答数
     level_one_correct_answers: Mapped[int] = mapped_column(
         Integer, default=0
@@ -104,3 +109,16 @@ class UserSummary(Base):
     user: Mapped['User'] = relationship(
         back_populates='user_summaries', single_parent=True
     )
+
+
+class UserLevelStat(Base):
+    __tablename__ = 'user_level_stats'
+
+    user_id: Mapped[uuid.UUID] = mapped_column(
+        ForeignKey('users.id'), primary_key=True
+    )
+    level: Mapped[int] = mapped_column(Integer, primary_key=True)
+    answers: Mapped[int] = mapped_column(Integer, default=0)  # 回答数
+    correct_answers: Mapped[int] = mapped_column(Integer, default=0)  # 正答数
+
+    user: Mapped['User'] = relationship(back_populates='user_level_stats')
@@ -0,0 +1,23 @@
+import argparse
+
+from sqlalchemy import create_engine
+
+import api.utils.env as env
+from api.utils.deck_counters import rebuild_deck_counters
+
+
+DB_URL = env.MIGRATE_DB_URL
+engine = create_engine(DB_URL, echo=True)
+
+
+def rebuild(deck_ids: list[str] | None = None):
+    with engine.begin() as connection:
+        rebuild_deck_counters(connection, deck_ids)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--deck', dest='deck_ids', action='append')
+    args = parser.parse_args()
+
+    rebuild(args.deck_ids)
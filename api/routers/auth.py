@@ -10,12 +10,14 @@ import api.cruds.auth as auth_crud
 import api.utils.env as env
 from api.db import get_db
 from api.service.auth import get_active_user_permission
+from api.utils.profiling import query_budget
 
 
 router = APIRouter()
 
 
 @router.post('/signup', response_model=bool)
+@query_budget(7)
 async def signup(
     form_data: auth_schema.SignupRequestForm,
     db: AsyncSession = Depends(get_db),
@@ -26,6 +28,7 @@ async def signup(
 
 
 @router.post('/signup-verify', response_model=str | None)
+@query_budget(6)
 async def signup_verify(
     body: auth_schema.Verification, db: AsyncSession = Depends(get_db)
 ):
@@ -37,6 +40,7 @@ async def signup_verify(
 
 
 @router.get('/verify', response_model=None)
+@query_budget(1)
 async def verify(
     user: user_schema.User = Depends(get_active_user_permission),
 ):
@@ -51,6 +55,7 @@ async def verify(
 
 
 @router.post('/login')
+@query_budget(1)
 async def login_for_access_token(
     form_data: auth_schema.EmailPasswordRequestForm,
     db: AsyncSession = Depends(get_db),
@@ -76,6 +81,7 @@ async def login_for_access_token(
 
 
 @router.post('/login-and-user-verify')
+@query_budget(3)
 async def login_and_user_verify(
     form_data: auth_schema.LoginAndVerifyForm,
     db: AsyncSession = Depends(get_db),
@@ -84,10 +90,7 @@ async def login_and_user_verify(
         email=form_data.email, password=form_data.password
     )
     user = await user_crud.authenticate_user(db, serialized_form_data)
-
-    user.is_active = True
-    await db.commit()
-    await db.refresh(user)
+    user = await user_crud.activate_user(db, user)
 
     access_token_expires = timedelta(
         minutes=int(env.ACCESS_TOKEN_EXPIRE_MINUTES)
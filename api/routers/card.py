@@ -1,55 +1,179 @@
 import uuid
 import base64
+from typing import AsyncIterator
 
-from fastapi import APIRouter, Depends, UploadFile, HTTPException, status
+from fastapi import (
+    APIRouter,
+    Depends,
+    HTTPException,
+    Query,
+    Request,
+    Response,
+    UploadFile,
+    status,
+)
+from fastapi.responses import (
+    ORJSONResponse,
+    RedirectResponse,
+    StreamingResponse,
+)
 from sqlalchemy.ext.asyncio import AsyncSession
 
 import api.schemas.card as card_schema
 import api.schemas.user as user_schema
 import api.cruds.card as card_crud
+import api.cruds.deck as deck_crud
+import api.utils.card_io as card_io
 import api.utils.env as env
-from api.utils.aws import get_s3_client
-from api.service.auth import get_active_user_permission
+import api.utils.fast_json as fast_json
+import api.utils.http as http_util
+import api.utils.image_upload as image_upload_util
+from api.utils.storage import StorageObjectNotFound, get_storage
+from api.service.auth import get_active_user_permission, get_read_db
 from api.db import get_db
+from api.utils.profiling import query_budget
 
 
 router = APIRouter()
 
+IMAGE_CACHE_CONTROL = 'private, max-age=86400'
+UPLOAD_CHUNK_SIZE = 64 * 1024
+
 
 @router.get('/card/{card_id}', response_model=card_schema.CardResponse)
+@query_budget(2)
 async def get_card(
     card_id: str,
-    db: AsyncSession = Depends(get_db),
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_read_db),
     user: user_schema.User = Depends(get_active_user_permission),
 ):
     card = await card_crud.get_card(db, card_id, user.id)
+    etag = http_util.make_etag('card', card.id, card.updated_at)
+    headers = http_util.get_validator_headers(etag, card.updated_at)
+    if http_util.is_not_modified(request.headers, etag, card.updated_at):
+        return Response(
+            status_code=status.HTTP_304_NOT_MODIFIED, headers=headers
+        )
+    response.headers.update(headers)
     return card_schema.CardResponse.model_validate(card)
 
 
 @router.get('/cards/{deck_id}', response_model=list[card_schema.CardResponse])
+@query_budget(3)
 async def get_cards(
     deck_id: str,
+    request: Request,
+    limit: int | None = Query(default=None, ge=1, le=1000),
+    cursor: str | None = None,
+    db: AsyncSession = Depends(get_read_db),
+    user: user_schema.User = Depends(get_active_user_permission),
+):
+    card_count, last_modified = await card_crud.get_cards_version(
+        db, deck_id, user.id
+    )
+    etag = http_util.make_etag(
+        'cards', deck_id, card_count, last_modified, limit, cursor
+    )
+    headers = http_util.get_validator_headers(etag, last_modified)
+    if http_util.is_not_modified(request.headers, etag, last_modified):
+        return Response(
+            status_code=status.HTTP_304_NOT_MODIFIED, headers=headers
+        )
+
+    cards, next_cursor = await card_crud.get_cards(db, deck_id, limit, cursor)
+    if next_cursor is not None:
+        headers['X-Next-Cursor'] = next_cursor
+    return ORJSONResponse(fast_json.card_rows_to_dicts(cards), headers=headers)
+
+
+@router.get('/cards/{deck_id}/export')
+@query_budget(3)
+async def export_cards(
+    deck_id: str,
+    file_format: card_io.CardFileFormat = Query(
+        default='ndjson', alias='format'
+    ),
     db: AsyncSession = Depends(get_db),
     user: user_schema.User = Depends(get_active_user_permission),
 ):
-    cards = await card_crud.get_cards(db, deck_id)
-    return [card_schema.CardResponse.model_validate(card) for card in cards]
+    await deck_crud.get_deck(db, deck_id, user.id)
+
+    async def content():
+        include_header = True
+        async for rows in card_crud.stream_cards(deck_id):
+            if file_format == 'csv':
+                yield card_io.format_csv(rows, include_header)
+                include_header = False
+            else:
+                yield card_io.format_ndjson(rows)
+
+    return StreamingResponse(
+        content(),
+        media_type=card_io.MEDIA_TYPES[file_format],
+        headers={
+            'Content-Disposition': (
+                f'attachment; filename="cards-{deck_id}.{file_format}"'
+            )
+        },
+    )
+
+
+@router.post(
+    '/cards/{deck_id}/import', response_model=card_schema.CardImportResult
+)
+@query_budget(6)
+async def import_cards(
+    deck_id: str,
+    upload_file: UploadFile,
+    file_format: card_io.CardFileFormat | None = Query(
+        default=None, alias='format'
+    ),
+    db: AsyncSession = Depends(get_db),
+    user: user_schema.User = Depends(get_active_user_permission),
+):
+    await deck_crud.get_deck(db, deck_id, user.id)
+    records = card_io.iter_records(
+        upload_file.file,
+        file_format or card_io.guess_format(upload_file.filename),
+    )
+    return await card_crud.import_cards(db, records, deck_id, user.id)
 
 
 @router.get(
     '/answer-replay-cards/{deck_id}',
     response_model=list[card_schema.CardResponse],
 )
+@query_budget(2)
 async def get_answer_replay_cards(
     deck_id: str,
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     user: user_schema.User = Depends(get_active_user_permission),
 ):
     cards = await card_crud.get_answer_replay_cards(db, deck_id)
-    return cards
+    return ORJSONResponse(fast_json.card_rows_to_dicts(cards))
+
+
+@router.get('/review-queue', response_model=list[card_schema.CardResponse])
+@query_budget(2)
+async def get_review_queue(
+    limit: int = Query(default=50, ge=1, le=1000),
+    cursor: str | None = None,
+    db: AsyncSession = Depends(get_read_db),
+    user: user_schema.User = Depends(get_active_user_permission),
+):
+    cards, next_cursor = await card_crud.get_review_queue(
+        db, user.id, limit, cursor
+    )
+    headers = {}
+    if next_cursor is not None:
+        headers['X-Next-Cursor'] = next_cursor
+    return ORJSONResponse(fast_json.card_rows_to_dicts(cards), headers=headers)
 
 
 @router.post('/card/{deck_id}', response_model=card_schema.CardResponse)
+@query_budget(6)
 async def create_card(
     deck_id: str,
     form_data: card_schema.CardCreate,
@@ -61,6 +185,7 @@ async def create_card(
 
 
 @router.put('/card/{card_id}', response_model=card_schema.CardResponse)
+@query_budget(4)
 async def update_card(
     card_id: str,
     form_data: card_schema.CardUpdate,
@@ -71,7 +196,10 @@ async def update_card(
     return card_schema.CardResponse.model_validate(card)
 
 
+# 認証ユーザー、カードとレベル別間隔の取得、カードの更新、
+# レベル別集計と出題日ヒストグラムの加算
 @router.put('/card-answer/{card_id}', response_model=None)
+@query_budget(5)
 async def update_card_answer(
     card_id: str,
     form_data: card_schema.CardUpdateForAnswerRequest,
@@ -82,7 +210,19 @@ async def update_card_answer(
     return None
 
 
+# 回答の件数や内容によらず /card-answer/{card_id} と同じ5文
+@router.put('/card-answers', response_model=list[card_schema.CardAnswerResult])
+@query_budget(5)
+async def update_card_answers(
+    form_data: card_schema.CardAnswersRequest,
+    db: AsyncSession = Depends(get_db),
+    user: user_schema.User = Depends(get_active_user_permission),
+):
+    return await card_crud.update_card_answers(db, form_data, user.id)
+
+
 @router.delete('/card/{card_id}', response_model=None)
+@query_budget(5)
 async def delete_card(
     card_id: str,
     db: AsyncSession = Depends(get_db),
@@ -93,48 +233,168 @@ async def delete_card(
 
 
 @router.get('/download-card-image/{card_id}')
+@query_budget(2)
 async def download_card_image(
     card_id: str,
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     user: user_schema.User = Depends(get_active_user_permission),
 ):
     card = await card_crud.get_card(db, card_id, user.id)
-    bucket = env.S3_BUCKET_NAME
-    s3_client = get_s3_client()
+    if not card.image_path:
+        raise HTTPException(status_code=404, detail='Image not found')
 
     try:
-        s3_object = s3_client.get_object(Bucket=bucket, Key=card.image_path)
-        image_data = s3_object['Body'].read()
+        image_data = await get_storage().get(card.image_path)
         return base64.b64encode(image_data).decode('utf-8')
-    except s3_client.exceptions.NoSuchKey:
-        return HTTPException(status_code=404, detail='Image not found')
+    except StorageObjectNotFound:
+        raise HTTPException(status_code=404, detail='Image not found') from None
     except Exception as e:
-        return HTTPException(
+        raise HTTPException(
             status_code=500, detail=f'Error retrieving image: {str(e)}'
+        ) from e
+
+
+@router.get('/card-image/{card_id}')
+@query_budget(2)
+async def get_card_image(
+    card_id: str,
+    request: Request,
+    redirect: bool = False,
+    db: AsyncSession = Depends(get_read_db),
+    user: user_schema.User = Depends(get_active_user_permission),
+):
+    card = await card_crud.get_card(db, card_id, user.id)
+    if not card.image_path:
+        raise HTTPException(status_code=404, detail='Image not found')
+
+    storage = get_storage()
+    if redirect:
+        url = storage.presigned_url(
+            card.image_path, env.IMAGE_PRESIGNED_URL_EXPIRES
+        )
+        if url is not None:
+            return RedirectResponse(
+                url, status_code=status.HTTP_307_TEMPORARY_REDIRECT
+            )
+
+    try:
+        object_info = await storage.head(card.image_path)
+    except StorageObjectNotFound:
+        raise HTTPException(status_code=404, detail='Image not found') from None
+
+    headers = {
+        'Accept-Ranges': 'bytes',
+        'Cache-Control': IMAGE_CACHE_CONTROL,
+        'ETag': object_info.etag,
+        'Last-Modified': http_util.http_date(object_info.last_modified),
+    }
+    if http_util.etag_matches(
+        request.headers.get('if-none-match'), object_info.etag
+    ):
+        return Response(
+            status_code=status.HTTP_304_NOT_MODIFIED, headers=headers
+        )
+
+    try:
+        byte_range = http_util.parse_range(
+            request.headers.get('range'), object_info.size
+        )
+    except http_util.RangeNotSatisfiable as e:
+        return Response(
+            status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+            headers={'Content-Range': f'bytes */{e.size}'},
         )
 
+    if object_info.size == 0:
+        return Response(media_type=object_info.content_type, headers=headers)
+
+    status_code = status.HTTP_200_OK
+    start, end = 0, object_info.size - 1
+    if byte_range is not None:
+        status_code = status.HTTP_206_PARTIAL_CONTENT
+        start, end = byte_range
+        headers['Content-Range'] = f'bytes {start}-{end}/{object_info.size}'
+    headers['Content-Length'] = str(end - start + 1)
+
+    return StreamingResponse(
+        storage.iter_range(card.image_path, start, end),
+        status_code=status_code,
+        media_type=object_info.content_type,
+        headers=headers,
+    )
+
 
 @router.post('/upload-card-image/{deck_id}', response_model=str)
+@query_budget(1)
 async def upload_card_image(
     deck_id: str,
     upload_image: UploadFile,
     user: user_schema.User = Depends(get_active_user_permission),
 ):
+    key = get_card_image_key(deck_id, upload_image.filename)
+
+    async def chunks():
+        while chunk := await upload_image.read(UPLOAD_CHUNK_SIZE):
+            yield chunk
+
+    await store_card_image(key, chunks())
+    return key
+
+
+@router.post('/upload-card-image/{deck_id}/stream', response_model=str)
+@query_budget(1)
+async def upload_card_image_stream(
+    deck_id: str,
+    filename: str,
+    request: Request,
+    user: user_schema.User = Depends(get_active_user_permission),
+):
+    content_length = request.headers.get('content-length')
+    if (
+        content_length is not None
+        and content_length.isdigit()
+        and int(content_length) > env.IMAGE_UPLOAD_MAX_BYTES
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail='Image is too large',
+        )
+
+    key = get_card_image_key(deck_id, filename)
+    await store_card_image(key, request.stream())
+    return key
+
+
+def get_card_image_key(deck_id: str, filename: str | None) -> str:
     upload_file_name = '{uuid}-{file_name}'.format(
-        uuid=str(uuid.uuid4()), file_name=upload_image.filename
+        uuid=str(uuid.uuid4()), file_name=filename
     )
-    key = 'cards/images/{deck_id}/{file_name}'.format(
+    return 'cards/images/{deck_id}/{file_name}'.format(
         deck_id=deck_id, file_name=upload_file_name
     )
-    bucket = env.S3_BUCKET_NAME
 
-    s3_client = get_s3_client()
 
+async def store_card_image(key: str, chunks: AsyncIterator[bytes]):
     try:
-        s3_client.put_object(Key=key, Bucket=bucket, Body=upload_image.file)
-        return key
+        await image_upload_util.upload_image(
+            get_storage(),
+            key,
+            chunks,
+            env.IMAGE_UPLOAD_MAX_BYTES,
+            env.IMAGE_UPLOAD_PART_BYTES,
+        )
+    except image_upload_util.ImageTooLarge:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail='Image is too large',
+        ) from None
+    except image_upload_util.UnsupportedImageType:
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail='Unsupported image type',
+        ) from None
     except Exception as e:
-        return HTTPException(
+        raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f'S3 Upload Error: {e}',
-        )
+        ) from e
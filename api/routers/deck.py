@@ -1,54 +1,78 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Request, Response, status
+from fastapi.responses import ORJSONResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 
 import api.schemas.deck as deck_schema
 import api.schemas.user as user_schema
 import api.cruds.deck as deck_crud
-from api.service.auth import get_active_user_permission
+import api.utils.fast_json as fast_json
+import api.utils.http as http_util
+from api.service.auth import get_active_user_permission, get_read_db
 from api.db import get_db
+from api.utils.profiling import query_budget
 
 
 router = APIRouter()
 
 
 @router.get('/deck/{deck_id}', response_model=deck_schema.DeckResponse)
+@query_budget(2)
 async def get_deck(
     deck_id: str,
-    db: AsyncSession = Depends(get_db),
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_read_db),
     user: user_schema.User = Depends(get_active_user_permission),
 ):
     deck = await deck_crud.get_deck(db, deck_id, user.id)
+    etag = http_util.make_etag('deck', deck.id, deck.updated_at)
+    headers = http_util.get_validator_headers(etag, deck.updated_at)
+    if http_util.is_not_modified(request.headers, etag, deck.updated_at):
+        return Response(
+            status_code=status.HTTP_304_NOT_MODIFIED, headers=headers
+        )
+    response.headers.update(headers)
     return deck_schema.DeckResponse.model_validate(deck)
 
 
 @router.get('/decks', response_model=list[deck_schema.DeckResponse])
+@query_budget(3)
 async def get_decks(
-    db: AsyncSession = Depends(get_db),
+    request: Request,
+    db: AsyncSession = Depends(get_read_db),
     user: user_schema.User = Depends(get_active_user_permission),
 ):
+    deck_count, last_modified = await deck_crud.get_decks_version(db, user.id)
+    etag = http_util.make_etag('decks', user.id, deck_count, last_modified)
+    headers = http_util.get_validator_headers(etag, last_modified)
+    if http_util.is_not_modified(request.headers, etag, last_modified):
+        return Response(
+            status_code=status.HTTP_304_NOT_MODIFIED, headers=headers
+        )
+
     decks = await deck_crud.get_decks(db, user.id)
-    return [deck_schema.DeckResponse.model_validate(deck) for deck in decks]
+    return ORJSONResponse(
+        [fast_json.deck_to_dict(deck) for deck in decks], headers=headers
+    )
 
 
 @router.get(
     '/decks-with-card-count',
     response_model=list[deck_schema.DeckWithCardCountResponse] | None,
 )
+@query_budget(4)
 async def get_decks_with_card_count(
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     user: user_schema.User = Depends(get_active_user_permission),
 ):
     decks = await deck_crud.get_decks_and_card_count(db, user.id)
-    print('#' * 100)
-    print(decks)
-    return [
-        deck_schema.DeckWithCardCountResponse.model_validate(deck)
-        for deck in decks
-    ]
-    return None
+    return ORJSONResponse(
+        [fast_json.deck_with_card_count_to_dict(deck) for deck in decks]
+    )
 
 
 @router.post('/deck', response_model=deck_schema.DeckResponse)
+@query_budget(3)
 async def create_deck(
     form_data: deck_schema.DeckCreate,
     db: AsyncSession = Depends(get_db),
@@ -59,6 +83,7 @@ async def create_deck(
 
 
 @router.put('/deck/{deck_id}', response_model=deck_schema.DeckResponse)
+@query_budget(4)
 async def update_deck(
     deck_id: str,
     form_data: deck_schema.DeckUpdate,
@@ -70,6 +95,7 @@ async def update_deck(
 
 
 @router.delete('/deck/{deck_id}', response_model=None)
+@query_budget(7)
 async def delete_deck(
     deck_id: str,
     db: AsyncSession = Depends(get_db),
@@ -0,0 +1,117 @@
+from fastapi import APIRouter, Depends
+from fastapi.responses import PlainTextResponse
+
+import api.schemas.internal as internal_schema
+from api.db import (
+    get_pool_stats,
+    pool_checkout_timeouts,
+    pool_checkout_wait,
+    replica_router,
+)
+from api.utils.auth import password_hasher
+from api.utils.cache import get_cache_backend
+from api.utils.mail import mail_dispatcher
+from api.utils.metrics import (
+    format_prometheus_histograms,
+    format_prometheus_samples,
+)
+from api.utils.profiling import query_budget, request_metrics
+from api.service.auth import verify_internal_token
+
+
+router = APIRouter(
+    prefix='/internal',
+    dependencies=[Depends(verify_internal_token)],
+    include_in_schema=False,
+)
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+@router.get('/metrics', response_class=PlainTextResponse)
+@query_budget(0)
+async def get_internal_metrics():
+    pool_stats = get_pool_stats()
+    replica_stats = replica_router.stats()
+    lines = [
+        *request_metrics.render(),
+        *format_prometheus_samples(
+            'db_pool_checked_out',
+            'gauge',
+            'Connections currently checked out of the pool.',
+            [({}, pool_stats['checked_out'])],
+        ),
+        *format_prometheus_samples(
+            'db_pool_checkout_timeouts_total',
+            'counter',
+            'Pool checkouts that timed out.',
+            [({}, pool_checkout_timeouts.value)],
+        ),
+        *format_prometheus_histograms(
+            'db_pool_checkout_wait_seconds',
+            'Time spent waiting for a pooled connection.',
+            [({}, pool_checkout_wait)],
+        ),
+        *format_prometheus_samples(
+            'db_replica_lag_seconds',
+            'gauge',
+            'Replication lag of each read replica (-1 if unknown).',
+            [
+                (
+                    {'replica': replica['url']},
+                    -1
+                    if replica['lag_seconds'] is None
+                    else replica['lag_seconds'],
+                )
+                for replica in replica_stats['replicas']
+            ],
+        ),
+        *format_prometheus_samples(
+            'db_reads_total',
+            'counter',
+            'Read-only sessions by target.',
+            [
+                ({'target': 'primary'}, replica_stats['primary_reads']),
+                ({'target': 'replica'}, replica_stats['replica_reads']),
+            ],
+        ),
+    ]
+    return PlainTextResponse(
+        '\n'.join(lines) + '\n', media_type=PROMETHEUS_CONTENT_TYPE
+    )
+
+
+@router.get('/pool-stats', response_model=internal_schema.PoolStatsResponse)
+@query_budget(0)
+async def get_internal_pool_stats():
+    return get_pool_stats()
+
+
+@router.get('/replica-stats', response_model=internal_schema.ReplicaRouterStats)
+@query_budget(0)
+async def get_internal_replica_stats():
+    return replica_router.stats()
+
+
+@router.get(
+    '/cache-stats',
+    response_model=dict[str, internal_schema.CacheStats],
+)
+@query_budget(0)
+async def get_internal_cache_stats():
+    return get_cache_backend().stats()
+
+
+@router.get('/mail-stats', response_model=internal_schema.MailStats)
+@query_budget(0)
+async def get_internal_mail_stats():
+    return mail_dispatcher.stats()
+
+
+@router.get(
+    '/password-hasher-stats',
+    response_model=internal_schema.PasswordHasherStats,
+)
+@query_budget(0)
+async def get_internal_password_hasher_stats():
+    return password_hasher.stats()
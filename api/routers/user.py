@@ -3,14 +3,17 @@ from sqlalchemy.ext.asyncio import AsyncSession
 
 import api.schemas.user as user_schema
 import api.cruds.user as user_crud
+import api.cruds.card as card_crud
 from api.db import get_db
-from api.service.auth import get_active_user_permission
+from api.service.auth import get_active_user_permission, get_read_db
+from api.utils.profiling import query_budget
 
 
 router = APIRouter()
 
 
 @router.get('/user', response_model=user_schema.UserResponse)
+@query_budget(1)
 async def get_user(
     user: user_schema.User = Depends(get_active_user_permission),
 ):
@@ -18,17 +21,37 @@ async def get_user(
 
 
 @router.get('/user-settings', response_model=user_schema.UserSettingsResponse)
+@query_budget(2)
 async def get_user_settings(
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     user: user_schema.User = Depends(get_active_user_permission),
 ):
     return await user_crud.get_user_settings(db, user.id)
 
 
+@router.get(
+    '/user-statistics', response_model=user_schema.UserStatisticsResponse
+)
+@query_budget(2)
+async def get_user_statistics(
+    db: AsyncSession = Depends(get_read_db),
+    user: user_schema.User = Depends(get_active_user_permission),
+):
+    levels = await user_crud.get_level_stats(db, user.id)
+    return user_schema.UserStatisticsResponse(levels=levels)
+
+
+# reschedule=true の場合はカードの更新とヒストグラムの再構築の3文が加わる
 @router.put('/user-settings', response_model=None)
+@query_budget(5)
 async def update_user_settings(
     form_data: user_schema.UserSettingsRequest,
+    reschedule: bool = False,
     db: AsyncSession = Depends(get_db),
     user: user_schema.User = Depends(get_active_user_permission),
 ):
-    await user_crud.update_user_settings(db, user.id, form_data)
+    level_intervals = await user_crud.update_user_settings(
+        db, user.id, form_data
+    )
+    if reschedule:
+        await card_crud.reschedule_cards(db, user.id, level_intervals)
@@ -1,14 +1,15 @@
 import uuid
 from datetime import datetime
+from typing import Literal
 
-from pydantic import BaseModel, field_serializer
+from pydantic import BaseModel, Field, field_serializer
 
 
 class BaseCard(BaseModel):
-    sentence: str
-    meaning: str
-    image_path: str | None = None
-    etymology: str | None = None
+    sentence: str = Field(max_length=1024)
+    meaning: str = Field(max_length=1024)
+    image_path: str | None = Field(default=None, max_length=255)
+    etymology: str | None = Field(default=None, max_length=1024)
 
 
 class CardCreate(BaseCard):
@@ -23,6 +24,34 @@ class CardUpdateForAnswerRequest(BaseModel):
     is_correct: bool
 
 
+class CardAnswer(CardUpdateForAnswerRequest):
+    card_id: uuid.UUID
+    answered_at: datetime | None = None
+
+
+class CardAnswersRequest(BaseModel):
+    answers: list[CardAnswer] = Field(max_length=1000)
+
+
+class CardAnswerResult(BaseModel):
+    card_id: uuid.UUID
+    status: Literal['ok', 'not_found', 'forbidden']
+    savings_score: int | None = None
+    retention_state: bool | None = None
+    next_answer_date: datetime | None = None
+
+
+class CardImportError(BaseModel):
+    row: int
+    detail: str
+
+
+class CardImportResult(BaseModel):
+    inserted: int
+    failed: int
+    errors: list[CardImportError]
+
+
 class CardResponse(BaseCard):
     id: uuid.UUID
     previous_answer_date: datetime | None = None
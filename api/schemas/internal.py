@@ -0,0 +1,60 @@
+from pydantic import BaseModel
+
+
+class HistogramBucket(BaseModel):
+    le: str
+    count: int
+
+
+class Histogram(BaseModel):
+    buckets: list[HistogramBucket]
+    sum: float
+    count: int
+
+
+class PoolStatsResponse(BaseModel):
+    pool_size: int
+    max_overflow: int
+    checked_in: int
+    checked_out: int
+    overflow: int
+    checkout_timeouts: int
+    checkout_wait_seconds: Histogram
+
+
+class ReplicaStats(BaseModel):
+    url: str
+    lag_seconds: float | None
+    available: bool
+    checked_out: int
+
+
+class ReplicaRouterStats(BaseModel):
+    replicas: list[ReplicaStats]
+    max_lag_seconds: float
+    primary_reads: int
+    replica_reads: int
+    sticky_reads: int
+
+
+class CacheStats(BaseModel):
+    size: int
+    max_size: int
+    ttl_seconds: float
+    hits: int
+    misses: int
+
+
+class MailStats(BaseModel):
+    queued: int
+    sent: int
+    retried: int
+    dropped: int
+
+
+class PasswordHasherStats(BaseModel):
+    workers: int
+    in_flight: int
+    waiting: int
+    rejected: int
+    queue_wait_seconds: Histogram
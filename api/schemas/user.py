@@ -1,3 +1,5 @@
+import uuid
+
 from pydantic import BaseModel
 from typing import TypedDict
 
@@ -16,6 +18,16 @@ class User(BaseUser):
         orm_mode = True
 
 
+class ActiveUser(BaseUser):
+    id: uuid.UUID
+    email: str
+    is_active: bool
+
+    class Config:
+        from_attributes = True
+        frozen = True
+
+
 class UserCreate(BaseUser):
     email: str
     password: str
@@ -45,6 +57,16 @@ class UserSettingsResponse(BaseUserSettings):
     pass
 
 
+class UserLevelStatResponse(BaseModel):
+    level: int
+    answers: int
+    correct_answers: int
+
+
+class UserStatisticsResponse(BaseModel):
+    levels: list[UserLevelStatResponse]
+
+
 class LevelData(TypedDict):
     month: int
     day: int
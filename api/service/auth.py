@@ -1,12 +1,15 @@
-from fastapi import Depends, HTTPException, status
+import hmac
+
+from fastapi import Depends, Header, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.ext.asyncio import AsyncSession
 from jose import jwt, JWTError
 
+import api.schemas.user as user_schema
 import api.utils.env as env
 from api.schemas.auth import TokenData
-from api.db import get_db
-from api.cruds.user import get_user
+from api.db import get_db, replica_router, set_session_user
+from api.cruds.user import get_active_user
 
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl='token')
@@ -34,7 +37,7 @@ async def get_active_user_permission(
     db: AsyncSession = Depends(get_db),
     token_data: TokenData = Depends(get_user_id_by_token),
 ):
-    user = await get_user(db, token_data.user_id)
+    user = await get_active_user(db, token_data.user_id)
     if user is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail='User not found'
@@ -43,4 +46,23 @@ async def get_active_user_permission(
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN, detail='Inactive user'
         )
+    set_session_user(db, user.id)
     return user
+
+
+async def get_read_db(
+    user: user_schema.User = Depends(get_active_user_permission),
+):
+    # 読み取り専用のルート用。書き込み直後のユーザーはプライマリから読む
+    session_factory = await replica_router.get_read_session(user.id)
+    async with session_factory() as session:
+        yield session
+
+
+def verify_internal_token(x_internal_token: str | None = Header(default=None)):
+    if (
+        not env.INTERNAL_API_TOKEN
+        or x_internal_token is None
+        or not hmac.compare_digest(x_internal_token, env.INTERNAL_API_TOKEN)
+    ):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
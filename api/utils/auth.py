@@ -1,5 +1,16 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, TypeVar
+
+from fastapi import HTTPException, status
 from passlib.context import CryptContext
 
+import api.utils.env as env
+from api.utils.metrics import Counter, Histogram
+
+
+T = TypeVar('T')
 
 pwd_context = CryptContext(schemes=['bcrypt'], deprecated='auto')
 
@@ -10,3 +21,76 @@ def verify_password(plain_password, hashed_password):
 
 def get_password_hash(password):
     return pwd_context.hash(password)
+
+
+class PasswordHasher:
+    def __init__(self, workers: int, max_waiting: int, wait_timeout: float):
+        self.workers = workers
+        self.max_waiting = max_waiting
+        self.wait_timeout = wait_timeout
+        self.executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix='password'
+        )
+        self.semaphore: asyncio.Semaphore | None = None
+        self.in_flight = 0
+        self.waiting = 0
+        self.rejected = Counter()
+        self.queue_wait = Histogram()
+
+    async def run(self, func: Callable[..., T], *args) -> T:
+        if self.semaphore is None:
+            self.semaphore = asyncio.Semaphore(self.workers)
+        if self.waiting >= self.max_waiting:
+            self.reject()
+
+        started = time.perf_counter()
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self.semaphore.acquire(), self.wait_timeout)
+        except TimeoutError:
+            self.reject()
+        finally:
+            self.waiting -= 1
+        self.queue_wait.observe(time.perf_counter() - started)
+
+        self.in_flight += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.executor, func, *args)
+        finally:
+            self.in_flight -= 1
+            self.semaphore.release()
+
+    def reject(self):
+        self.rejected.inc()
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail='Too many authentication requests',
+            headers={'Retry-After': '1'},
+        )
+
+    def stats(self) -> dict:
+        return {
+            'workers': self.workers,
+            'in_flight': self.in_flight,
+            'waiting': self.waiting,
+            'rejected': self.rejected.value,
+            'queue_wait_seconds': self.queue_wait.snapshot(),
+        }
+
+
+password_hasher = PasswordHasher(
+    workers=env.PASSWORD_HASH_WORKERS,
+    max_waiting=env.PASSWORD_HASH_MAX_WAITING,
+    wait_timeout=env.PASSWORD_HASH_WAIT_TIMEOUT,
+)
+
+
+async def verify_password_async(plain_password, hashed_password) -> bool:
+    return await password_hasher.run(
+        verify_password, plain_password, hashed_password
+    )
+
+
+async def get_password_hash_async(password) -> str:
+    return await password_hasher.run(get_password_hash, password)
@@ -1,9 +1,13 @@
+from functools import lru_cache
+
 import boto3
 from botocore.client import BaseClient
+from botocore.config import Config
 
 import api.utils.env as env
 
 
+@lru_cache
 def get_s3_client() -> BaseClient:
     region = env.S3_REGION
     access_key = env.S3_ACCESS_KEY
@@ -14,5 +18,9 @@ def get_s3_client() -> BaseClient:
         aws_access_key_id=access_key,
         aws_secret_access_key=secret_key,
         region_name=region,
+        config=Config(
+            max_pool_connections=env.S3_MAX_POOL_CONNECTIONS,
+            retries={'mode': 'standard'},
+        ),
     )
     return s3_client
@@ -0,0 +1,455 @@
+import asyncio
+import logging
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from dataclasses import dataclass
+from functools import lru_cache, wraps
+from typing import Any, Awaitable, Callable, Hashable
+
+import redis.asyncio as redis
+from pydantic import TypeAdapter, ValidationError
+
+import api.utils.env as env
+from api.utils.metrics import Counter
+
+
+logger = logging.getLogger(__name__)
+
+MISSING = object()
+
+
+class TTLCache:
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = Counter()
+        self.misses = Counter()
+        self._entries: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._entries.get(key, MISSING)
+            if entry is not MISSING:
+                expires_at, value = entry
+                if expires_at > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits.inc()
+                    return value
+                del self._entries[key]
+        self.misses.inc()
+        return default
+
+    def set(self, key: Hashable, value: Any):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def delete(self, key: Hashable):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        return {
+            'size': len(self._entries),
+            'max_size': self.max_size,
+            'ttl_seconds': self.ttl,
+            'hits': self.hits.value,
+            'misses': self.misses.value,
+        }
+
+
+@dataclass(frozen=True)
+class CacheNamespace:
+    name: str
+    ttl: float
+    max_size: int
+    value_type: Any  # Redis には JSON で保存し、この型として検証して読み戻す
+
+
+@lru_cache
+def get_type_adapter(value_type: Any) -> TypeAdapter:
+    return TypeAdapter(value_type)
+
+
+class CacheBackend(ABC):
+    @abstractmethod
+    def start(self):
+        pass
+
+    @abstractmethod
+    async def stop(self):
+        pass
+
+    @abstractmethod
+    async def get(
+        self, namespace: CacheNamespace, key: str, default: Any = None
+    ) -> Any:
+        pass
+
+    @abstractmethod
+    async def get_versioned(
+        self, namespace: CacheNamespace, key: str
+    ) -> tuple[Any, Any]:
+        # 値 (ない場合は MISSING) と、delete のたびに変わるバージョンを返す
+        pass
+
+    @abstractmethod
+    async def set(
+        self,
+        namespace: CacheNamespace,
+        key: str,
+        value: Any,
+        version: Any = MISSING,
+    ):
+        # version を渡した場合は、その後に delete されていなければ保存する
+        pass
+
+    @abstractmethod
+    async def delete(self, namespace: CacheNamespace, key: str):
+        pass
+
+    @abstractmethod
+    async def clear(self):
+        pass
+
+    @abstractmethod
+    def stats(self) -> dict[str, dict]:
+        pass
+
+
+class LocalCacheBackend(CacheBackend):
+    # プロセス内の LRU。ワーカー間では共有・無効化されない
+    def __init__(self, max_ttl: float | None = None):
+        self.max_ttl = max_ttl
+        self.caches: dict[str, TTLCache] = {}
+        self.versions: dict[str, TTLCache] = {}
+        self.generation = 0  # clear のたびに進める
+        self._lock = threading.Lock()
+
+    def get_cache(self, namespace: CacheNamespace) -> TTLCache:
+        cache = self.caches.get(namespace.name)
+        if cache is None:
+            ttl = namespace.ttl
+            if self.max_ttl is not None:
+                ttl = min(ttl, self.max_ttl)
+            with self._lock:
+                cache = self.caches.setdefault(
+                    namespace.name, TTLCache(namespace.max_size, ttl)
+                )
+        return cache
+
+    def get_versions(self, namespace: CacheNamespace) -> TTLCache:
+        versions = self.versions.get(namespace.name)
+        if versions is None:
+            with self._lock:
+                versions = self.versions.setdefault(
+                    namespace.name,
+                    TTLCache(namespace.max_size, namespace.ttl),
+                )
+        return versions
+
+    def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+    async def get(
+        self, namespace: CacheNamespace, key: str, default: Any = None
+    ) -> Any:
+        return self.get_cache(namespace).get(key, default)
+
+    def get_version(self, namespace: CacheNamespace, key: str) -> tuple:
+        return self.generation, self.get_versions(namespace).get(key, 0)
+
+    async def get_versioned(
+        self, namespace: CacheNamespace, key: str
+    ) -> tuple[Any, Any]:
+        version = self.get_version(namespace, key)
+        return self.get_cache(namespace).get(key, MISSING), version
+
+    async def set(
+        self,
+        namespace: CacheNamespace,
+        key: str,
+        value: Any,
+        version: Any = MISSING,
+    ):
+        if (
+            version is not MISSING
+            and self.get_version(namespace, key) != version
+        ):
+            return
+        self.get_cache(namespace).set(key, value)
+
+    async def delete(self, namespace: CacheNamespace, key: str):
+        # evict がバージョンを進められるよう、先に作っておく
+        self.get_versions(namespace)
+        self.evict(namespace.name, key)
+
+    def evict(self, namespace_name: str, key: str):
+        cache = self.caches.get(namespace_name)
+        if cache is not None:
+            cache.delete(key)
+        versions = self.versions.get(namespace_name)
+        if versions is not None:
+            versions.set(key, versions.get(key, 0) + 1)
+
+    def evict_all(self):
+        self.generation += 1
+        for cache in list(self.caches.values()):
+            cache.clear()
+
+    async def clear(self):
+        self.evict_all()
+
+    def stats(self) -> dict[str, dict]:
+        return {name: cache.stats() for name, cache in self.caches.items()}
+
+
+class RedisCacheBackend(CacheBackend):
+    # 値は Redis で共有し、各ワーカーは短い TTL のローカルコピーを持つ。
+    # 削除は Pub/Sub で全ワーカーに通知してローカルコピーを捨てさせる
+    def __init__(
+        self,
+        client: redis.Redis,
+        key_prefix: str,
+        local_ttl: float,
+        reconnect_seconds: float = 1,
+    ):
+        self.client = client
+        self.key_prefix = key_prefix
+        self.channel = f'{key_prefix}:invalidate'
+        self.local = LocalCacheBackend(max_ttl=local_ttl)
+        self.reconnect_seconds = reconnect_seconds
+        self.task: asyncio.Task | None = None
+        self.remote_hits: dict[str, Counter] = {}
+        self.errors = Counter()
+
+    def get_key(self, namespace: CacheNamespace, key: str) -> str:
+        return f'{self.key_prefix}:{namespace.name}:{key}'
+
+    def get_version_key(self, namespace: CacheNamespace, key: str) -> str:
+        return f'{self.key_prefix}:version:{namespace.name}:{key}'
+
+    def start(self):
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+        await self.client.aclose()
+
+    async def run(self):
+        while True:
+            try:
+                async with self.client.pubsub() as pubsub:
+                    await pubsub.subscribe(self.channel)
+                    # 購読していない間の無効化を取りこぼしている可能性がある
+                    await self.local.clear()
+                    async for message in pubsub.listen():
+                        if message['type'] == 'message':
+                            self.handle_invalidation(message['data'])
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception('Cache invalidation subscriber failed')
+                await asyncio.sleep(self.reconnect_seconds)
+
+    def handle_invalidation(self, data: bytes):
+        namespace_name, _, key = data.decode().partition('\n')
+        if namespace_name == '*':
+            self.local.evict_all()
+        else:
+            self.local.evict(namespace_name, key)
+
+    async def get(
+        self, namespace: CacheNamespace, key: str, default: Any = None
+    ) -> Any:
+        value, _ = await self.get_versioned(namespace, key)
+        return default if value is MISSING else value
+
+    async def get_versioned(
+        self, namespace: CacheNamespace, key: str
+    ) -> tuple[Any, Any]:
+        value, local_version = await self.local.get_versioned(namespace, key)
+        if value is not MISSING:
+            return value, None
+
+        try:
+            data, version = await self.client.mget(
+                self.get_key(namespace, key),
+                self.get_version_key(namespace, key),
+            )
+        except redis.RedisError:
+            self.errors.inc()
+            logger.warning('Cache get failed', exc_info=True)
+            return MISSING, MISSING
+        if data is None:
+            return MISSING, version
+
+        try:
+            value = get_type_adapter(namespace.value_type).validate_json(data)
+        except ValidationError:
+            self.errors.inc()
+            logger.warning(
+                'Discarding undecodable cache entry %s:%s',
+                namespace.name,
+                key,
+                exc_info=True,
+            )
+            return MISSING, version
+        self.remote_hits.setdefault(namespace.name, Counter()).inc()
+        # 応答を待つ間に無効化を受け取っていたら、古い値をローカルに残さない
+        await self.local.set(namespace, key, value, local_version)
+        return value, version
+
+    async def set(
+        self,
+        namespace: CacheNamespace,
+        key: str,
+        value: Any,
+        version: Any = MISSING,
+    ):
+        data = get_type_adapter(namespace.value_type).dump_json(value)
+        px = max(int(namespace.ttl * 1000), 1)
+        local_version = self.local.get_version(namespace, key)
+        try:
+            if version is MISSING:
+                await self.client.set(self.get_key(namespace, key), data, px=px)
+            elif not await self.set_if_version(
+                namespace, key, data, px, version
+            ):
+                return
+        except redis.RedisError:
+            self.errors.inc()
+            logger.warning('Cache set failed', exc_info=True)
+        await self.local.set(namespace, key, value, local_version)
+
+    async def set_if_version(
+        self,
+        namespace: CacheNamespace,
+        key: str,
+        data: bytes,
+        px: int,
+        version: bytes | None,
+    ) -> bool:
+        # 読み込み中に delete されていたら、古い値で上書きしない
+        version_key = self.get_version_key(namespace, key)
+        async with self.client.pipeline(transaction=True) as pipeline:
+            try:
+                await pipeline.watch(version_key)
+                if await pipeline.get(version_key) != version:
+                    return False
+                pipeline.multi()
+                pipeline.set(self.get_key(namespace, key), data, px=px)
+                await pipeline.execute()
+            except redis.WatchError:
+                return False
+        return True
+
+    async def delete(self, namespace: CacheNamespace, key: str):
+        await self.local.delete(namespace, key)
+        version_key = self.get_version_key(namespace, key)
+        try:
+            async with self.client.pipeline(transaction=False) as pipeline:
+                pipeline.delete(self.get_key(namespace, key))
+                pipeline.incr(version_key)
+                pipeline.pexpire(version_key, max(int(namespace.ttl * 1000), 1))
+                pipeline.publish(self.channel, f'{namespace.name}\n{key}')
+                await pipeline.execute()
+        except redis.RedisError:
+            # 他のワーカーには TTL が切れるまで古い値が残る
+            self.errors.inc()
+            logger.error(
+                'Cache invalidation failed for %s:%s',
+                namespace.name,
+                key,
+                exc_info=True,
+            )
+
+    async def clear(self):
+        await self.local.clear()
+        try:
+            keys = [
+                key
+                async for key in self.client.scan_iter(
+                    match=f'{self.key_prefix}:*'
+                )
+                if key.decode() != self.channel
+            ]
+            if keys:
+                await self.client.delete(*keys)
+            await self.client.publish(self.channel, '*\n')
+        except redis.RedisError:
+            self.errors.inc()
+            logger.error('Cache clear failed', exc_info=True)
+
+    def stats(self) -> dict[str, dict]:
+        stats = self.local.stats()
+        for name, cache_stats in stats.items():
+            remote_hits = self.remote_hits.get(name)
+            if remote_hits is not None:
+                cache_stats['hits'] += remote_hits.value
+                cache_stats['misses'] -= remote_hits.value
+        return stats
+
+
+@lru_cache
+def get_cache_backend() -> CacheBackend:
+    match env.CACHE_BACKEND:
+        case 'local':
+            return LocalCacheBackend()
+        case 'redis':
+            return RedisCacheBackend(
+                redis.from_url(env.CACHE_REDIS_URL),
+                env.CACHE_KEY_PREFIX,
+                env.CACHE_LOCAL_TTL_SECONDS,
+            )
+    raise ValueError(f'Unknown cache backend: {env.CACHE_BACKEND}')
+
+
+def cached(
+    namespace: CacheNamespace,
+    key: Callable[..., str],
+    condition: Callable[[Any], bool] = lambda value: value is not None,
+):
+    # key は装飾する関数と同じ引数を受け取ってキャッシュキーを返す
+    def decorator(func: Callable[..., Awaitable[Any]]):
+        @wraps(func)
+        async def wrapper(*args, **kwargs):
+            cache_key = key(*args, **kwargs)
+            backend = get_cache_backend()
+            value, version = await backend.get_versioned(namespace, cache_key)
+            if value is not MISSING:
+                return value
+
+            # 読み込み中に無効化された場合、古い値は保存されない
+            value = await func(*args, **kwargs)
+            if condition(value):
+                await backend.set(namespace, cache_key, value, version)
+            return value
+
+        wrapper.cache_namespace = namespace
+        return wrapper
+
+    return decorator
+
+
+async def invalidate(namespace: CacheNamespace, key: str):
+    await get_cache_backend().delete(namespace, key)
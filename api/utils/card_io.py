@@ -0,0 +1,129 @@
+import codecs
+import csv
+import io
+import json
+import uuid
+from datetime import datetime
+from typing import IO, Iterator, Literal
+
+from sqlalchemy import Row
+
+
+CardFileFormat = Literal['ndjson', 'csv']
+
+EXPORT_FIELDS = [
+    'id',
+    'sentence',
+    'meaning',
+    'image_path',
+    'etymology',
+    'previous_answer_date',
+    'next_answer_date',
+    'retention_state',
+    'savings_score',
+    'updated_at',
+    'created_at',
+    'deck_id',
+]
+
+MEDIA_TYPES = {'ndjson': 'application/x-ndjson', 'csv': 'text/csv'}
+
+
+def serialize_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    return value
+
+
+def format_ndjson(rows: list[Row]) -> str:
+    return ''.join(
+        json.dumps(
+            {
+                field: serialize_value(getattr(row, field))
+                for field in EXPORT_FIELDS
+            },
+            ensure_ascii=False,
+        )
+        + '\n'
+        for row in rows
+    )
+
+
+def format_csv(rows: list[Row], include_header: bool = False) -> str:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if include_header:
+        writer.writerow(EXPORT_FIELDS)
+    for row in rows:
+        writer.writerow(
+            [
+                '' if value is None else serialize_value(value)
+                for value in (getattr(row, field) for field in EXPORT_FIELDS)
+            ]
+        )
+    return buffer.getvalue()
+
+
+def guess_format(filename: str | None) -> CardFileFormat:
+    if filename and filename.lower().endswith('.csv'):
+        return 'csv'
+    return 'ndjson'
+
+
+def iter_records(
+    file: IO[bytes], file_format: CardFileFormat
+) -> Iterator[tuple[int, dict | Exception]]:
+    if file_format == 'csv':
+        return iter_csv_records(file)
+    return iter_ndjson_records(file)
+
+
+def iter_lines(file: IO[bytes]) -> Iterator[str]:
+    # 行ごとにデコードし、不正なバイト列があってもそれより前の行は読めるようにする
+    for line_number, line in enumerate(file, start=1):
+        if line_number == 1:
+            line = line.removeprefix(codecs.BOM_UTF8)
+        yield line.decode('utf-8')
+
+
+def iter_ndjson_records(
+    file: IO[bytes],
+) -> Iterator[tuple[int, dict | Exception]]:
+    for row_number, line in enumerate(file, start=1):
+        if row_number == 1:
+            line = line.removeprefix(codecs.BOM_UTF8)
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line.decode('utf-8'))
+        except ValueError as e:
+            yield row_number, e
+            continue
+        if not isinstance(record, dict):
+            yield row_number, ValueError('Row must be a JSON object')
+            continue
+        yield row_number, record
+
+
+def iter_csv_records(
+    file: IO[bytes],
+) -> Iterator[tuple[int, dict | Exception]]:
+    reader = csv.DictReader(iter_lines(file))
+    try:
+        for record in reader:
+            yield (
+                reader.line_num,
+                {key: (value or None) for key, value in record.items() if key},
+            )
+    except csv.Error as e:
+        yield reader.line_num, e
+    except UnicodeDecodeError:
+        # 複数行にまたがるフィールドがあるため、以降の行は読み飛ばせない
+        yield (
+            reader.line_num + 1,
+            ValueError(
+                'Row is not valid UTF-8; the remaining rows were not read'
+            ),
+        )
@@ -0,0 +1,198 @@
+import asyncio
+import logging
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+from sqlalchemy import (
+    case,
+    delete,
+    func,
+    insert,
+    literal_column,
+    select,
+    update,
+)
+from sqlalchemy.engine import Connection
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+import api.models.card as card_model
+import api.models.deck as deck_model
+from api.cruds.common import get_upsert_increment_stmt, truncate_to_hour
+
+
+logger = logging.getLogger(__name__)
+
+# 経過済みのバケットをまとめる先。集計では現在より前のバケットとして合算される
+OVERDUE_BUCKET = datetime(1970, 1, 1)
+COMPACT_BATCH_SIZE = 1000
+# 複数ワーカーのうち1つだけが合算するためのロック名 (MySQL の GET_LOCK)
+COMPACT_LOCK_NAME = 'deck_due_buckets_compaction'
+
+
+def get_due_bucket(due_at: datetime) -> datetime:
+    if due_at.tzinfo is not None:
+        due_at = due_at.astimezone(ZoneInfo('Asia/Tokyo')).replace(tzinfo=None)
+    return due_at.replace(minute=0, second=0, microsecond=0)
+
+
+def get_current_bucket() -> datetime:
+    return get_due_bucket(datetime.now(ZoneInfo('Asia/Tokyo')))
+
+
+def add_due_increment(
+    due_increments: dict[tuple, int],
+    deck_id,
+    due_at: datetime | None,
+    card_count: int = 1,
+):
+    if due_at is None:
+        return
+    key = (deck_id, get_due_bucket(due_at))
+    due_increments[key] = due_increments.get(key, 0) + card_count
+
+
+def rebuild_deck_counters(connection: Connection, deck_ids: list | None = None):
+    Deck = deck_model.Deck.__table__
+    Card = card_model.Card.__table__
+
+    card_count = (
+        select(func.count(Card.c.id))
+        .where(Card.c.deck_id == Deck.c.id)
+        .scalar_subquery()
+    )
+    update_stmt = update(Deck).values(
+        card_count=card_count, updated_at=Deck.c.updated_at
+    )
+    if deck_ids is not None:
+        update_stmt = update_stmt.where(Deck.c.id.in_(deck_ids))
+
+    connection.execute(update_stmt)
+    rebuild_due_buckets(connection, deck_ids)
+
+
+def rebuild_due_buckets(
+    connection: Connection, deck_ids: list | None = None, user_id=None
+):
+    Deck = deck_model.Deck.__table__
+    DeckDueBucket = deck_model.DeckDueBucket.__table__
+    Card = card_model.Card.__table__
+
+    delete_stmt = delete(DeckDueBucket)
+    # 出題日を1時間単位に切り捨てて DB 内で集計する。経過済みは期限切れバケットへ
+    due_at = case(
+        (Card.c.next_answer_date < get_current_bucket(), OVERDUE_BUCKET),
+        else_=truncate_to_hour(
+            connection.dialect.name, Card.c.next_answer_date
+        ),
+    ).label('due_at')
+    select_stmt = (
+        select(Card.c.deck_id, due_at, func.count().label('card_count'))
+        .where(Card.c.next_answer_date.is_not(None))
+        .group_by(Card.c.deck_id, literal_column('due_at'))
+    )
+    if deck_ids is not None:
+        delete_stmt = delete_stmt.where(DeckDueBucket.c.deck_id.in_(deck_ids))
+        select_stmt = select_stmt.where(Card.c.deck_id.in_(deck_ids))
+    if user_id is not None:
+        delete_stmt = delete_stmt.where(
+            DeckDueBucket.c.deck_id.in_(
+                select(Deck.c.id).where(Deck.c.user_id == user_id)
+            )
+        )
+        select_stmt = select_stmt.where(Card.c.user_id == user_id)
+
+    connection.execute(delete_stmt)
+    connection.execute(
+        insert(DeckDueBucket).from_select(
+            ['deck_id', 'due_at', 'card_count'], select_stmt
+        )
+    )
+
+
+def compact_due_buckets(connection: Connection, deck_ids: list | None = None):
+    # 経過済みのバケットを期限切れバケットに合算し、0 件のバケットを削除する。
+    # 経過済みのバケットは削除せず、読み取った件数を差し引く。読み取り後に
+    # 並行する回答が加算しても差分がバケットに残り、次回に合算される
+    DeckDueBucket = deck_model.DeckDueBucket.__table__
+    select_stmt = select(
+        DeckDueBucket.c.deck_id,
+        DeckDueBucket.c.due_at,
+        DeckDueBucket.c.card_count,
+    ).where(
+        DeckDueBucket.c.due_at > OVERDUE_BUCKET,
+        DeckDueBucket.c.due_at < get_current_bucket(),
+        DeckDueBucket.c.card_count != 0,
+    )
+    delete_stmt = delete(DeckDueBucket).where(DeckDueBucket.c.card_count == 0)
+    if deck_ids is not None:
+        select_stmt = select_stmt.where(DeckDueBucket.c.deck_id.in_(deck_ids))
+        delete_stmt = delete_stmt.where(DeckDueBucket.c.deck_id.in_(deck_ids))
+
+    rows = connection.execute(select_stmt).all()
+    for i in range(0, len(rows), COMPACT_BATCH_SIZE):
+        due_increments = {}
+        for deck_id, due_at, card_count in rows[i : i + COMPACT_BATCH_SIZE]:
+            due_increments[(deck_id, due_at)] = -card_count
+            key = (deck_id, OVERDUE_BUCKET)
+            due_increments[key] = due_increments.get(key, 0) + card_count
+        connection.execute(
+            get_upsert_increment_stmt(
+                connection.dialect.name,
+                DeckDueBucket,
+                [
+                    {'deck_id': deck_id, 'due_at': due_at, 'card_count': count}
+                    for (deck_id, due_at), count in due_increments.items()
+                ],
+                ['card_count'],
+            )
+        )
+    connection.execute(delete_stmt)
+
+
+class DueBucketCompactor:
+    def __init__(self, engine: AsyncEngine, interval: float):
+        self.engine = engine
+        self.interval = interval
+        self.task: asyncio.Task | None = None
+
+    def start(self):
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self.task is None:
+            return
+        self.task.cancel()
+        try:
+            await self.task
+        except asyncio.CancelledError:
+            pass
+        self.task = None
+
+    async def run(self):
+        while True:
+            try:
+                await self.compact()
+            except Exception:
+                logger.exception('Failed to compact deck due buckets')
+            await asyncio.sleep(self.interval)
+
+    async def compact(self):
+        async with self.engine.connect() as connection:
+            mysql = connection.dialect.name == 'mysql'
+            if mysql:
+                # 他のワーカーが合算中なら待たずにスキップする
+                locked = await connection.scalar(
+                    select(func.get_lock(COMPACT_LOCK_NAME, 0))
+                )
+                await connection.commit()
+                if not locked:
+                    return
+            try:
+                async with connection.begin():
+                    await connection.run_sync(compact_due_buckets)
+            finally:
+                if mysql:
+                    await connection.scalar(
+                        select(func.release_lock(COMPACT_LOCK_NAME))
+                    )
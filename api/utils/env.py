@@ -15,3 +15,91 @@ S3_ACCESS_KEY = os.environ.get('S3_ACCESS_KEY')
 S3_SECRET_KEY = os.environ.get('S3_SECRET_KEY')
 S3_BUCKET_NAME = os.environ.get('S3_BUCKET_NAME')
 S3_REGION = os.environ.get('S3_REGION')
+
+MIGRATE_DB_URL = os.environ.get(
+    'MIGRATE_DB_URL', 'mysql+pymysql://root@db:3306/app?charset=utf8'
+)
+
+DB_ECHO = os.environ.get('DB_ECHO', 'false').lower() == 'true'
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 5))
+DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', 10))
+DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE', 1800))
+DB_POOL_PRE_PING = os.environ.get('DB_POOL_PRE_PING', 'true').lower() == 'true'
+DB_POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', 30))
+
+INTERNAL_API_TOKEN = os.environ.get('INTERNAL_API_TOKEN')
+
+USER_CACHE_TTL_SECONDS = float(os.environ.get('USER_CACHE_TTL_SECONDS', 60))
+USER_CACHE_MAX_SIZE = int(os.environ.get('USER_CACHE_MAX_SIZE', 10000))
+SETTINGS_CACHE_TTL_SECONDS = float(
+    os.environ.get('SETTINGS_CACHE_TTL_SECONDS', 3600)
+)
+
+STORAGE_BACKEND = os.environ.get('STORAGE_BACKEND', 's3')
+LOCAL_STORAGE_ROOT = os.environ.get('LOCAL_STORAGE_ROOT', 'storage')
+S3_MAX_POOL_CONNECTIONS = int(os.environ.get('S3_MAX_POOL_CONNECTIONS', 20))
+IMAGE_PRESIGNED_URL_EXPIRES = int(
+    os.environ.get('IMAGE_PRESIGNED_URL_EXPIRES', 300)
+)
+
+IMAGE_UPLOAD_MAX_BYTES = int(
+    os.environ.get('IMAGE_UPLOAD_MAX_BYTES', 10 * 1024 * 1024)
+)
+IMAGE_UPLOAD_PART_BYTES = int(
+    os.environ.get('IMAGE_UPLOAD_PART_BYTES', 5 * 1024 * 1024)
+)
+
+FROM_MAIL_ADDRESS = os.environ.get('FROM_MAIL_ADDRESS')
+APP_PASSWORD = os.environ.get('APP_PASSWORD')
+SMTP_HOST = os.environ.get('SMTP_HOST', 'smtp.gmail.com')
+SMTP_PORT = int(os.environ.get('SMTP_PORT', 465))
+SMTP_USE_SSL = os.environ.get('SMTP_USE_SSL', 'true').lower() == 'true'
+SMTP_USERNAME = os.environ.get('SMTP_USERNAME', FROM_MAIL_ADDRESS)
+SMTP_PASSWORD = os.environ.get('SMTP_PASSWORD', APP_PASSWORD)
+MAIL_QUEUE_SIZE = int(os.environ.get('MAIL_QUEUE_SIZE', 10000))
+MAIL_BATCH_SIZE = int(os.environ.get('MAIL_BATCH_SIZE', 50))
+MAIL_MAX_RETRIES = int(os.environ.get('MAIL_MAX_RETRIES', 5))
+MAIL_RETRY_BACKOFF_SECONDS = float(
+    os.environ.get('MAIL_RETRY_BACKOFF_SECONDS', 1)
+)
+
+PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', 4))
+PASSWORD_HASH_MAX_WAITING = int(os.environ.get('PASSWORD_HASH_MAX_WAITING', 64))
+PASSWORD_HASH_WAIT_TIMEOUT = float(
+    os.environ.get('PASSWORD_HASH_WAIT_TIMEOUT', 5)
+)
+
+SCHEDULER = os.environ.get('SCHEDULER', 'step')
+SM2_EASE = float(os.environ.get('SM2_EASE', 2.5))
+
+SLOW_REQUEST_SECONDS = float(os.environ.get('SLOW_REQUEST_SECONDS', 1.0))
+
+# カンマ区切り。空ならすべてプライマリで読み書きする
+DB_REPLICA_URLS = [
+    url.strip()
+    for url in os.environ.get('DB_REPLICA_URLS', '').split(',')
+    if url.strip()
+]
+DB_REPLICA_MAX_LAG_SECONDS = float(
+    os.environ.get('DB_REPLICA_MAX_LAG_SECONDS', 2)
+)
+DB_REPLICA_LAG_CHECK_INTERVAL = float(
+    os.environ.get('DB_REPLICA_LAG_CHECK_INTERVAL', 5)
+)
+# 書き込んだユーザーの読み取りをプライマリに向ける時間 (レプリカ遅延の上限より長くする)
+DB_READ_YOUR_WRITES_SECONDS = float(
+    os.environ.get('DB_READ_YOUR_WRITES_SECONDS', 10)
+)
+
+CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'local')
+CACHE_REDIS_URL = os.environ.get('CACHE_REDIS_URL', 'redis://localhost:6379/0')
+CACHE_KEY_PREFIX = os.environ.get('CACHE_KEY_PREFIX', 'mastering-language')
+# redis バックエンドで各ワーカーが持つローカルコピーの TTL 上限
+CACHE_LOCAL_TTL_SECONDS = float(os.environ.get('CACHE_LOCAL_TTL_SECONDS', 30))
+DECK_COUNT_CACHE_TTL_SECONDS = float(
+    os.environ.get('DECK_COUNT_CACHE_TTL_SECONDS', 60)
+)
+# 経過した出題日バケットをデッキごとの期限切れバケットにまとめる間隔
+DUE_BUCKET_COMPACT_INTERVAL_SECONDS = float(
+    os.environ.get('DUE_BUCKET_COMPACT_INTERVAL_SECONDS', 3600)
+)
@@ -0,0 +1,29 @@
+from typing import Iterable
+
+from sqlalchemy import Row
+
+
+def card_rows_to_dicts(rows: Iterable[Row]) -> list[dict]:
+    # 列の並びは CardResponse と同じ。UUID・datetime は orjson がそのまま変換する
+    return [row._asdict() for row in rows]
+
+
+def deck_to_dict(deck) -> dict:
+    return {
+        'id': deck.id,
+        'name': deck.name,
+        'updated_at': deck.updated_at,
+        'created_at': deck.created_at,
+    }
+
+
+def deck_with_card_count_to_dict(deck_with_card_count: dict) -> dict:
+    deck = deck_with_card_count['deck']
+    return {
+        'id': deck.id,
+        'name': deck.name,
+        'card_count': deck_with_card_count['card_count'],
+        'answer_replay_count': deck_with_card_count['answer_replay_count'],
+        'updated_at': deck.updated_at,
+        'created_at': deck.created_at,
+    }
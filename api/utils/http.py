@@ -0,0 +1,101 @@
+import hashlib
+from collections.abc import Mapping
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+
+from api.utils.oblivion_curve import TOKYO
+
+
+def parse_range(range_header: str | None, size: int) -> tuple[int, int] | None:
+    if not range_header or size == 0 or not range_header.startswith('bytes='):
+        return None
+    ranges = range_header.removeprefix('bytes=').split(',')
+    if len(ranges) != 1:
+        return None
+
+    start, _, end = ranges[0].strip().partition('-')
+    # 解釈できない Range は無視して全体を返す (RFC 9110 14.2)
+    if not (start or end) or not all(
+        part.isascii() and part.isdigit() for part in (start, end) if part
+    ):
+        return None
+
+    if not start:
+        suffix_length = int(end)
+        if suffix_length == 0:
+            raise RangeNotSatisfiable(size)
+        return max(size - suffix_length, 0), size - 1
+    first = int(start)
+    last = int(end) if end else size - 1
+    if end and first > last:
+        return None
+    if first >= size:
+        raise RangeNotSatisfiable(size)
+    return first, min(last, size - 1)
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    candidates = [
+        tag.strip().removeprefix('W/') for tag in if_none_match.split(',')
+    ]
+    return etag.removeprefix('W/') in candidates
+
+
+def http_date(value: datetime) -> str:
+    return format_datetime(to_utc(value), usegmt=True)
+
+
+def to_utc(value: datetime) -> datetime:
+    # DB の naive な日時は日本時間
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=TOKYO)
+    return value.astimezone(timezone.utc)
+
+
+def make_etag(*parts) -> str:
+    # 同じ内容でも列の並びなどが変わりうるため弱い ETag にする
+    digest = hashlib.sha1(
+        '|'.join(str(part) for part in parts).encode()
+    ).hexdigest()
+    return f'W/"{digest[:32]}"'
+
+
+def get_validator_headers(
+    etag: str, last_modified: datetime | None
+) -> dict[str, str]:
+    # ブラウザ等が毎回再検証するように no-cache を付ける
+    headers = {'Cache-Control': 'private, no-cache', 'ETag': etag}
+    if last_modified is not None:
+        headers['Last-Modified'] = http_date(last_modified)
+    return headers
+
+
+def is_not_modified(
+    request_headers: Mapping[str, str],
+    etag: str,
+    last_modified: datetime | None,
+) -> bool:
+    # If-None-Match がある場合は If-Modified-Since を無視する (RFC 9110)
+    if_none_match = request_headers.get('if-none-match')
+    if_modified_since = request_headers.get('if-modified-since')
+    if if_none_match:
+        return etag_matches(if_none_match, etag)
+    if not if_modified_since or last_modified is None:
+        return False
+    try:
+        modified_since = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+    if modified_since.tzinfo is None:
+        return False
+    return to_utc(last_modified).replace(microsecond=0) <= modified_since
+
+
+class RangeNotSatisfiable(Exception):
+    def __init__(self, size: int):
+        super().__init__(size)
+        self.size = size
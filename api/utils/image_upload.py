@@ -0,0 +1,90 @@
+import io
+from typing import AsyncIterator
+
+from api.utils.storage import Storage
+
+
+SIGNATURE_LENGTH = 12
+
+
+class ImageTooLarge(Exception):
+    pass
+
+
+class UnsupportedImageType(Exception):
+    pass
+
+
+def detect_image_type(head: bytes) -> str | None:
+    if head.startswith(b'\xff\xd8\xff'):
+        return 'image/jpeg'
+    if head.startswith(b'\x89PNG\r\n\x1a\n'):
+        return 'image/png'
+    if head.startswith((b'GIF87a', b'GIF89a')):
+        return 'image/gif'
+    if head.startswith(b'RIFF') and head[8:12] == b'WEBP':
+        return 'image/webp'
+    return None
+
+
+async def upload_image(
+    storage: Storage,
+    key: str,
+    chunks: AsyncIterator[bytes],
+    max_size: int,
+    part_size: int,
+) -> str:
+    buffer = bytearray()
+    size = 0
+    content_type = None
+    upload_id = None
+    parts = []
+
+    try:
+        async for chunk in chunks:
+            size += len(chunk)
+            if size > max_size:
+                raise ImageTooLarge(max_size)
+            buffer += chunk
+
+            if content_type is None and len(buffer) >= SIGNATURE_LENGTH:
+                content_type = detect_image_type(bytes(buffer))
+                if content_type is None:
+                    raise UnsupportedImageType()
+
+            while len(buffer) >= part_size:
+                if upload_id is None:
+                    upload_id = await storage.create_multipart_upload(
+                        key, content_type
+                    )
+                parts.append(
+                    await storage.upload_part(
+                        key,
+                        upload_id,
+                        len(parts) + 1,
+                        bytes(buffer[:part_size]),
+                    )
+                )
+                del buffer[:part_size]
+
+        if content_type is None:
+            content_type = detect_image_type(bytes(buffer))
+            if content_type is None:
+                raise UnsupportedImageType()
+
+        if upload_id is None:
+            await storage.put(key, io.BytesIO(buffer), content_type)
+        else:
+            if buffer:
+                parts.append(
+                    await storage.upload_part(
+                        key, upload_id, len(parts) + 1, bytes(buffer)
+                    )
+                )
+            await storage.complete_multipart_upload(key, upload_id, parts)
+    except BaseException:
+        if upload_id is not None:
+            await storage.abort_multipart_upload(key, upload_id)
+        raise
+
+    return content_type
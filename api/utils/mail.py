@@ -1,19 +1,21 @@
-import os
+import asyncio
+import logging
 import smtplib
 import ssl
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from email.mime.text import MIMEText
 from typing import Callable, Awaitable
 from functools import wraps
 
-from dotenv import load_dotenv
 from pydantic import BaseModel
 
 import api.models.auth as auth_model
+import api.utils.env as env
+from api.utils.metrics import Counter
 
 
-load_dotenv()
-
-SSL_PORT = 465
+logger = logging.getLogger(__name__)
 
 
 class Message(BaseModel):
@@ -22,24 +24,185 @@ class Message(BaseModel):
     message_body: str
 
 
+@dataclass
+class OutboxMessage:
+    message: MIMEText
+    attempts: int = 0
+
+
 def create_message(message: Message):
     mime_text = MIMEText(message.message_body)
     mime_text['Subject'] = message.subject
-    mime_text['From'] = os.environ.get('FROM_MAIL_ADDRESS')
+    mime_text['From'] = env.FROM_MAIL_ADDRESS
     mime_text['To'] = message.message_to
 
     return mime_text
 
 
+class MailDispatcher:
+    def __init__(
+        self,
+        queue_size: int,
+        batch_size: int,
+        max_retries: int,
+        retry_backoff_seconds: float,
+    ):
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.max_retries = max_retries
+        self.retry_backoff_seconds = retry_backoff_seconds
+        self.queue: asyncio.Queue[OutboxMessage] | None = None
+        self.task: asyncio.Task | None = None
+        self.executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix='smtp'
+        )
+        self.smtp: smtplib.SMTP | None = None
+        self.sent = Counter()
+        self.retried = Counter()
+        self.dropped = Counter()
+
+    def start(self):
+        # タスクが止まっていてもキューに残ったメールは引き継ぐ
+        if self.queue is None:
+            self.queue = asyncio.Queue(maxsize=self.queue_size)
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self.run())
+
+    async def stop(self, timeout: float = 10):
+        if self.task is None:
+            return
+        try:
+            await asyncio.wait_for(self.queue.join(), timeout)
+        except TimeoutError:
+            logger.warning(
+                'Mail outbox stopped with %d unsent messages',
+                self.queue.qsize(),
+            )
+        self.task.cancel()
+        self.task = None
+        await asyncio.get_running_loop().run_in_executor(
+            self.executor, self.close_connection
+        )
+
+    def enqueue(self, message: MIMEText):
+        self.start()
+        self.put(OutboxMessage(message))
+
+    def put(self, outbox_message: OutboxMessage):
+        try:
+            self.queue.put_nowait(outbox_message)
+        except asyncio.QueueFull:
+            self.dropped.inc()
+            logger.error(
+                'Mail outbox is full, dropping mail to %s',
+                outbox_message.message['To'],
+            )
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            while len(batch) < self.batch_size and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+
+            try:
+                failed = await loop.run_in_executor(
+                    self.executor, self.send_batch, batch
+                )
+                for outbox_message in failed:
+                    self.retry(outbox_message)
+            except Exception:
+                logger.exception('Failed to dispatch %d mails', len(batch))
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+
+    def retry(self, outbox_message: OutboxMessage):
+        outbox_message.attempts += 1
+        if outbox_message.attempts > self.max_retries:
+            self.dropped.inc()
+            logger.error(
+                'Giving up sending mail to %s after %d attempts',
+                outbox_message.message['To'],
+                outbox_message.attempts,
+            )
+            return
+
+        self.retried.inc()
+        delay = self.retry_backoff_seconds * 2 ** (outbox_message.attempts - 1)
+        asyncio.get_running_loop().call_later(delay, self.put, outbox_message)
+
+    def send_batch(self, batch: list[OutboxMessage]) -> list[OutboxMessage]:
+        failed = []
+        for outbox_message in batch:
+            try:
+                self.send(outbox_message.message)
+                self.sent.inc()
+            except (smtplib.SMTPException, OSError):
+                logger.exception(
+                    'Failed to send mail to %s', outbox_message.message['To']
+                )
+                self.close_connection()
+                failed.append(outbox_message)
+            except Exception:
+                # 再送しても失敗するため破棄し、残りのメールの送信を続ける
+                self.dropped.inc()
+                logger.exception(
+                    'Dropping mail to %s', outbox_message.message['To']
+                )
+                self.close_connection()
+        return failed
+
+    def send(self, message: MIMEText):
+        try:
+            self.get_connection().send_message(message)
+        except smtplib.SMTPServerDisconnected:
+            self.close_connection()
+            self.get_connection().send_message(message)
+
+    def get_connection(self) -> smtplib.SMTP:
+        if self.smtp is None:
+            if env.SMTP_USE_SSL:
+                smtp = smtplib.SMTP_SSL(
+                    env.SMTP_HOST,
+                    env.SMTP_PORT,
+                    context=ssl.create_default_context(),
+                )
+            else:
+                smtp = smtplib.SMTP(env.SMTP_HOST, env.SMTP_PORT)
+            if env.SMTP_USERNAME:
+                smtp.login(env.SMTP_USERNAME, env.SMTP_PASSWORD)
+            self.smtp = smtp
+        return self.smtp
+
+    def close_connection(self):
+        if self.smtp is None:
+            return
+        try:
+            self.smtp.quit()
+        except (smtplib.SMTPException, OSError):
+            self.smtp.close()
+        self.smtp = None
+
+    def stats(self) -> dict:
+        return {
+            'queued': self.queue.qsize() if self.queue is not None else 0,
+            'sent': self.sent.value,
+            'retried': self.retried.value,
+            'dropped': self.dropped.value,
+        }
+
+
+mail_dispatcher = MailDispatcher(
+    queue_size=env.MAIL_QUEUE_SIZE,
+    batch_size=env.MAIL_BATCH_SIZE,
+    max_retries=env.MAIL_MAX_RETRIES,
+    retry_backoff_seconds=env.MAIL_RETRY_BACKOFF_SECONDS,
+)
+
+
 def send_mail(message: MIMEText):
-    smtp = smtplib.SMTP_SSL(
-        'smtp.gmail.com', SSL_PORT, context=ssl.create_default_context()
-    )
-    smtp.login(
-        os.environ.get('FROM_MAIL_ADDRESS'), os.environ.get('APP_PASSWORD')
-    )
-    smtp.send_message(message)
-    smtp.close()
+    mail_dispatcher.enqueue(message)
 
 
 def after_verification_send_mail_decorator(
@@ -0,0 +1,112 @@
+import bisect
+import threading
+
+
+DEFAULT_BUCKETS = (
+    0.001,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+
+class Counter:
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: int = 1):
+        with self._lock:
+            self.value += amount
+
+
+class Histogram:
+    def __init__(self, buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self.bucket_counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.bucket_counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            bucket_counts = list(self.bucket_counts)
+            total = self.sum
+            count = self.count
+
+        cumulative = 0
+        buckets = []
+        for upper_bound, bucket_count in zip(
+            (*self.buckets, float('inf')), bucket_counts
+        ):
+            cumulative += bucket_count
+            buckets.append(
+                {'le': format_bound(upper_bound), 'count': cumulative}
+            )
+
+        return {'buckets': buckets, 'sum': total, 'count': count}
+
+
+def format_bound(upper_bound: float) -> str:
+    if upper_bound == float('inf'):
+        return '+Inf'
+    return repr(float(upper_bound))
+
+
+def format_labels(labels: dict[str, str]) -> str:
+    if not labels:
+        return ''
+    escaped = [
+        '{}="{}"'.format(
+            name,
+            str(value)
+            .replace('\\', '\\\\')
+            .replace('"', '\\"')
+            .replace('\n', '\\n'),
+        )
+        for name, value in labels.items()
+    ]
+    return '{' + ','.join(escaped) + '}'
+
+
+def format_prometheus_samples(
+    name: str,
+    metric_type: str,
+    help_text: str,
+    samples: list[tuple[dict[str, str], float]],
+) -> list[str]:
+    lines = [f'# HELP {name} {help_text}', f'# TYPE {name} {metric_type}']
+    for labels, value in samples:
+        lines.append(f'{name}{format_labels(labels)} {value}')
+    return lines
+
+
+def format_prometheus_histograms(
+    name: str,
+    help_text: str,
+    histograms: list[tuple[dict[str, str], Histogram]],
+) -> list[str]:
+    lines = [f'# HELP {name} {help_text}', f'# TYPE {name} histogram']
+    for labels, histogram in histograms:
+        snapshot = histogram.snapshot()
+        for bucket in snapshot['buckets']:
+            bucket_labels = format_labels({**labels, 'le': bucket['le']})
+            lines.append(f'{name}_bucket{bucket_labels} {bucket["count"]}')
+        lines.append(f'{name}_sum{format_labels(labels)} {snapshot["sum"]}')
+        lines.append(f'{name}_count{format_labels(labels)} {snapshot["count"]}')
+    return lines
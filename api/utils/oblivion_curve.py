@@ -6,6 +6,8 @@ MONTH = 2592000
 DAY = 86400
 HOUR = 3600
 
+TOKYO = ZoneInfo('Asia/Tokyo')
+
 level_and_score_mapping = {
     1: 'level_one',
     2: 'level_two',
@@ -23,6 +25,24 @@ def get_next_answer_date_delta_seconds(
     return months * MONTH + days * DAY + hours * HOUR
 
 
-def get_next_answer_date(next_answer_date_delta_seconds: int):
-    now = datetime.now(ZoneInfo('Asia/Tokyo'))
-    return now + timedelta(seconds=next_answer_date_delta_seconds)
+def get_interval_for_score(
+    level_intervals: tuple[int, ...], savings_score: int
+) -> int:
+    return level_intervals[min(max(savings_score, 1), len(level_intervals)) - 1]
+
+
+def get_next_answer_date(
+    next_answer_date_delta_seconds: int, answered_at: datetime | None = None
+):
+    if answered_at is None:
+        answered_at = datetime.now(TOKYO)
+    return answered_at + timedelta(seconds=next_answer_date_delta_seconds)
+
+
+def get_answered_at(answered_at: datetime | None = None) -> datetime:
+    now = datetime.now(TOKYO)
+    if answered_at is None:
+        return now
+    if answered_at.tzinfo is None:
+        answered_at = answered_at.replace(tzinfo=TOKYO)
+    return min(answered_at.astimezone(TOKYO), now)
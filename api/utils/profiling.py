@@ -0,0 +1,291 @@
+import logging
+import threading
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Callable, TypeVar
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from api.utils.metrics import (
+    Histogram,
+    format_prometheus_histograms,
+    format_prometheus_samples,
+)
+
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar('T', bound=Callable)
+
+MAX_RECORDED_STATEMENTS = 100
+MAX_LOGGED_STATEMENT_LENGTH = 500
+STATEMENT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+RESPONSE_SIZE_BUCKETS = (
+    1024,
+    10 * 1024,
+    100 * 1024,
+    1024 * 1024,
+    10 * 1024 * 1024,
+)
+
+
+@dataclass
+class RequestProfile:
+    statement_count: int = 0
+    db_time: float = 0.0
+    statements: list[tuple[str, float]] = field(default_factory=list)
+
+    def add_statement(self, statement: str, elapsed: float):
+        self.statement_count += 1
+        self.db_time += elapsed
+        if len(self.statements) < MAX_RECORDED_STATEMENTS:
+            self.statements.append((statement, elapsed))
+
+
+current_profile: ContextVar[RequestProfile | None] = ContextVar(
+    'current_profile', default=None
+)
+
+
+class RouteMetrics:
+    def __init__(self):
+        self.latency = Histogram()
+        self.db_time = Histogram()
+        self.statements = Histogram(STATEMENT_BUCKETS)
+        self.response_size = Histogram(RESPONSE_SIZE_BUCKETS)
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.routes: dict[tuple[str, str], RouteMetrics] = {}
+        self.responses: dict[tuple[str, str, int], int] = {}
+        self.budget_exceeded: dict[tuple[str, str], int] = {}
+        self._lock = threading.Lock()
+
+    def record(
+        self,
+        method: str,
+        route: str,
+        status_code: int,
+        elapsed: float,
+        response_size: int,
+        profile: RequestProfile,
+    ):
+        with self._lock:
+            route_metrics = self.routes.get((method, route))
+            if route_metrics is None:
+                route_metrics = self.routes[(method, route)] = RouteMetrics()
+            key = (method, route, status_code)
+            self.responses[key] = self.responses.get(key, 0) + 1
+
+        route_metrics.latency.observe(elapsed)
+        route_metrics.db_time.observe(profile.db_time)
+        route_metrics.statements.observe(profile.statement_count)
+        route_metrics.response_size.observe(response_size)
+
+    def record_budget_exceeded(self, method: str, route: str):
+        with self._lock:
+            key = (method, route)
+            self.budget_exceeded[key] = self.budget_exceeded.get(key, 0) + 1
+
+    def render(self) -> list[str]:
+        with self._lock:
+            routes = list(self.routes.items())
+            responses = list(self.responses.items())
+            budget_exceeded = list(self.budget_exceeded.items())
+
+        def histograms(attribute: str):
+            return [
+                (
+                    {'method': method, 'route': route},
+                    getattr(route_metrics, attribute),
+                )
+                for (method, route), route_metrics in routes
+            ]
+
+        return [
+            *format_prometheus_samples(
+                'http_requests_total',
+                'counter',
+                'Number of HTTP requests.',
+                [
+                    (
+                        {'method': method, 'route': route, 'status': status},
+                        count,
+                    )
+                    for (method, route, status), count in responses
+                ],
+            ),
+            *format_prometheus_samples(
+                'http_query_budget_exceeded_total',
+                'counter',
+                'Requests that issued more SQL statements than their budget.',
+                [
+                    ({'method': method, 'route': route}, count)
+                    for (method, route), count in budget_exceeded
+                ],
+            ),
+            *format_prometheus_histograms(
+                'http_request_duration_seconds',
+                'HTTP request latency.',
+                histograms('latency'),
+            ),
+            *format_prometheus_histograms(
+                'http_request_db_seconds',
+                'Time spent executing SQL statements per request.',
+                histograms('db_time'),
+            ),
+            *format_prometheus_histograms(
+                'http_request_sql_statements',
+                'Number of SQL statements per request.',
+                histograms('statements'),
+            ),
+            *format_prometheus_histograms(
+                'http_response_size_bytes',
+                'HTTP response body size.',
+                histograms('response_size'),
+            ),
+        ]
+
+
+request_metrics = RequestMetrics()
+
+
+def query_budget(max_statements: int) -> Callable[[T], T]:
+    # ルートが1リクエストで発行してよい SQL 文の数 (キャッシュが効いていない場合)
+    def decorator(endpoint: T) -> T:
+        endpoint.query_budget = max_statements
+        return endpoint
+
+    return decorator
+
+
+def get_query_budget(route) -> int | None:
+    return getattr(getattr(route, 'endpoint', None), 'query_budget', None)
+
+
+def instrument_engine(engine: AsyncEngine):
+    @event.listens_for(engine.sync_engine, 'before_cursor_execute')
+    def before_cursor_execute(
+        conn, cursor, statement, parameters, context, executemany
+    ):
+        conn.info.setdefault('query_started_at', []).append(time.perf_counter())
+
+    @event.listens_for(engine.sync_engine, 'after_cursor_execute')
+    def after_cursor_execute(
+        conn, cursor, statement, parameters, context, executemany
+    ):
+        elapsed = time.perf_counter() - conn.info['query_started_at'].pop()
+        profile = current_profile.get()
+        if profile is not None:
+            profile.add_statement(statement, elapsed)
+
+    @event.listens_for(engine.sync_engine, 'handle_error')
+    def handle_error(context):
+        started_at = context.connection.info.get('query_started_at')
+        if started_at:
+            started_at.pop()
+
+
+def format_statements(profile: RequestProfile) -> str:
+    return '\n'.join(
+        '  {:8.1f}ms  {}'.format(
+            statement_elapsed * 1000,
+            ' '.join(statement.split())[:MAX_LOGGED_STATEMENT_LENGTH],
+        )
+        for statement, statement_elapsed in profile.statements
+    )
+
+
+def log_slow_request(
+    method: str,
+    path: str,
+    status_code: int,
+    elapsed: float,
+    profile: RequestProfile,
+):
+    logger.warning(
+        'Slow request %s %s -> %d in %.3fs (%d statements, %.3fs in DB)\n%s',
+        method,
+        path,
+        status_code,
+        elapsed,
+        profile.statement_count,
+        profile.db_time,
+        format_statements(profile),
+    )
+
+
+def log_query_budget_exceeded(
+    method: str, route: str, budget: int, profile: RequestProfile
+):
+    logger.warning(
+        'Query budget exceeded %s %s: %d statements (budget %d)\n%s',
+        method,
+        route,
+        profile.statement_count,
+        budget,
+        format_statements(profile),
+    )
+
+
+class ProfilingMiddleware:
+    def __init__(self, app: ASGIApp, slow_request_seconds: float):
+        self.app = app
+        self.slow_request_seconds = slow_request_seconds
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        profile = RequestProfile()
+        token = current_profile.set(profile)
+        status_code = 500
+        response_size = 0
+
+        async def send_with_profile(message: Message):
+            nonlocal status_code, response_size
+            if message['type'] == 'http.response.start':
+                status_code = message['status']
+            elif message['type'] == 'http.response.body':
+                response_size += len(message.get('body', b''))
+            await send(message)
+
+        started_at = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_profile)
+        finally:
+            elapsed = time.perf_counter() - started_at
+            current_profile.reset(token)
+
+            # ルーティング後の scope にはマッチした APIRoute が入っている
+            route = scope.get('route')
+            route_path = getattr(route, 'path', 'unmatched')
+            request_metrics.record(
+                scope['method'],
+                route_path,
+                status_code,
+                elapsed,
+                response_size,
+                profile,
+            )
+            budget = get_query_budget(route)
+            if budget is not None and profile.statement_count > budget:
+                request_metrics.record_budget_exceeded(
+                    scope['method'], route_path
+                )
+                log_query_budget_exceeded(
+                    scope['method'], route_path, budget, profile
+                )
+            if elapsed >= self.slow_request_seconds:
+                log_slow_request(
+                    scope['method'],
+                    scope['path'],
+                    status_code,
+                    elapsed,
+                    profile,
+                )
@@ -0,0 +1,176 @@
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from functools import lru_cache
+
+import numpy as np
+
+import api.utils.env as env
+from api.utils.oblivion_curve import TOKYO, level_and_score_mapping
+
+
+MAX_SAVINGS_SCORE = len(level_and_score_mapping)
+
+
+@dataclass(frozen=True)
+class ScheduleResult:
+    savings_scores: np.ndarray  # 回答後のスコア
+    intervals: np.ndarray  # 次回出題までの秒数
+    retained: np.ndarray  # 定着済みになったか
+
+
+class Scheduler(ABC):
+    name: str
+
+    @abstractmethod
+    def schedule(
+        self,
+        savings_scores: np.ndarray,
+        is_correct: np.ndarray,
+        last_intervals: np.ndarray,
+        level_intervals: tuple[int, ...],
+    ) -> ScheduleResult:
+        pass
+
+    @abstractmethod
+    def get_reschedule_intervals(
+        self, level_intervals: tuple[int, ...]
+    ) -> dict[int, int]:
+        pass
+
+    def get_next_card_states(
+        self,
+        savings_scores: list[int],
+        is_correct: list[bool],
+        last_intervals: list[float | None],
+        level_intervals: tuple[int, ...],
+        answered_at: list[datetime],
+    ) -> list[dict]:
+        result = self.schedule(
+            np.asarray(savings_scores, dtype=np.int64),
+            np.asarray(is_correct, dtype=bool),
+            np.asarray(
+                [np.nan if i is None else i for i in last_intervals],
+                dtype=np.float64,
+            ),
+            level_intervals,
+        )
+
+        card_states = []
+        for answered, savings_score, interval, retained in zip(
+            answered_at,
+            result.savings_scores.tolist(),
+            result.intervals.tolist(),
+            result.retained.tolist(),
+        ):
+            if retained:
+                card_states.append(
+                    {'retention_state': True, 'previous_answer_date': answered}
+                )
+                continue
+            card_states.append(
+                {
+                    'savings_score': savings_score,
+                    'previous_answer_date': answered,
+                    'next_answer_date': answered + timedelta(seconds=interval),
+                }
+            )
+        return card_states
+
+
+class StepScheduler(Scheduler):
+    """ユーザー設定のレベル別間隔 (7段階) で出題日を決める"""
+
+    name = 'step'
+
+    def schedule(
+        self,
+        savings_scores: np.ndarray,
+        is_correct: np.ndarray,
+        last_intervals: np.ndarray,
+        level_intervals: tuple[int, ...],
+    ) -> ScheduleResult:
+        steps = np.asarray(level_intervals, dtype=np.int64)
+        levels = np.clip(savings_scores, 1, len(steps)) - 1
+
+        retained = is_correct & (savings_scores == MAX_SAVINGS_SCORE)
+        return ScheduleResult(
+            savings_scores=np.where(is_correct, savings_scores + 1, 1),
+            intervals=np.where(is_correct, steps[levels], steps[0]),
+            retained=retained,
+        )
+
+    def get_reschedule_intervals(
+        self, level_intervals: tuple[int, ...]
+    ) -> dict[int, int]:
+        # 正解時は回答前のスコアの間隔、不正解時はレベル1の間隔で出題日が決まる
+        steps = (level_intervals[0], *level_intervals)
+        return {
+            savings_score: steps[
+                min(savings_score - 1, len(level_intervals) - 1)
+            ]
+            for savings_score in level_and_score_mapping
+        }
+
+
+class SM2Scheduler(Scheduler):
+    """SM-2 方式: 正解するたびに直前の間隔を ease 倍に伸ばす"""
+
+    name = 'sm2'
+
+    def __init__(self, ease: float):
+        self.ease = ease
+
+    def schedule(
+        self,
+        savings_scores: np.ndarray,
+        is_correct: np.ndarray,
+        last_intervals: np.ndarray,
+        level_intervals: tuple[int, ...],
+    ) -> ScheduleResult:
+        first_interval = level_intervals[0]
+        last_intervals = np.where(
+            np.isnan(last_intervals), first_interval, last_intervals
+        )
+        grown_intervals = np.maximum(last_intervals * self.ease, first_interval)
+
+        retained = is_correct & (savings_scores == MAX_SAVINGS_SCORE)
+        return ScheduleResult(
+            savings_scores=np.where(
+                is_correct,
+                np.minimum(savings_scores + 1, MAX_SAVINGS_SCORE),
+                1,
+            ),
+            intervals=np.where(
+                is_correct, np.rint(grown_intervals), first_interval
+            ).astype(np.int64),
+            retained=retained,
+        )
+
+    def get_reschedule_intervals(
+        self, level_intervals: tuple[int, ...]
+    ) -> dict[int, int]:
+        # 2回目以降の間隔は直前の間隔から決まるため、レベル1のみ再計算する
+        return {1: level_intervals[0]}
+
+
+@lru_cache
+def get_scheduler() -> Scheduler:
+    if env.SCHEDULER == 'sm2':
+        return SM2Scheduler(env.SM2_EASE)
+    return StepScheduler()
+
+
+def get_last_interval(
+    previous_answer_date: datetime | None, next_answer_date: datetime | None
+) -> float | None:
+    if previous_answer_date is None or next_answer_date is None:
+        return None
+    if previous_answer_date.tzinfo is not None:
+        previous_answer_date = previous_answer_date.astimezone(TOKYO)
+    if next_answer_date.tzinfo is not None:
+        next_answer_date = next_answer_date.astimezone(TOKYO)
+    return (
+        next_answer_date.replace(tzinfo=None)
+        - previous_answer_date.replace(tzinfo=None)
+    ) / timedelta(seconds=1)
@@ -0,0 +1,346 @@
+import asyncio
+import mimetypes
+import shutil
+import uuid
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from functools import lru_cache, partial
+from pathlib import Path
+from typing import IO, AsyncIterator, Callable, TypeVar
+
+from botocore.client import BaseClient
+from botocore.exceptions import ClientError
+
+import api.utils.env as env
+from api.utils.aws import get_s3_client
+
+
+T = TypeVar('T')
+
+CHUNK_SIZE = 64 * 1024
+DEFAULT_CONTENT_TYPE = 'application/octet-stream'
+
+
+class StorageObjectNotFound(Exception):
+    pass
+
+
+@dataclass(frozen=True)
+class ObjectInfo:
+    size: int
+    content_type: str
+    etag: str
+    last_modified: datetime
+
+
+class Storage(ABC):
+    def __init__(self, max_workers: int):
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix='storage'
+        )
+
+    async def run(self, func: Callable[..., T], *args, **kwargs) -> T:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self.executor, partial(func, *args, **kwargs)
+        )
+
+    async def get(self, key: str) -> bytes:
+        return await self.run(self.get_sync, key)
+
+    async def put(
+        self, key: str, body: IO[bytes], content_type: str | None = None
+    ):
+        await self.run(self.put_sync, key, body, content_type)
+
+    async def delete(self, key: str):
+        await self.run(self.delete_sync, key)
+
+    async def head(self, key: str) -> ObjectInfo:
+        return await self.run(self.head_sync, key)
+
+    async def iter_range(
+        self, key: str, start: int, end: int
+    ) -> AsyncIterator[bytes]:
+        body = await self.run(self.open_range_sync, key, start, end)
+        try:
+            while chunk := await self.run(body.read, CHUNK_SIZE):
+                yield chunk
+        finally:
+            await self.run(body.close)
+
+    def presigned_url(self, key: str, expires_in: int) -> str | None:
+        return None
+
+    async def create_multipart_upload(
+        self, key: str, content_type: str | None = None
+    ) -> str:
+        return await self.run(
+            self.create_multipart_upload_sync, key, content_type
+        )
+
+    async def upload_part(
+        self, key: str, upload_id: str, part_number: int, data: bytes
+    ) -> dict:
+        return await self.run(
+            self.upload_part_sync, key, upload_id, part_number, data
+        )
+
+    async def complete_multipart_upload(
+        self, key: str, upload_id: str, parts: list[dict]
+    ):
+        await self.run(
+            self.complete_multipart_upload_sync, key, upload_id, parts
+        )
+
+    async def abort_multipart_upload(self, key: str, upload_id: str):
+        await self.run(self.abort_multipart_upload_sync, key, upload_id)
+
+    @abstractmethod
+    def get_sync(self, key: str) -> bytes:
+        pass
+
+    @abstractmethod
+    def head_sync(self, key: str) -> ObjectInfo:
+        pass
+
+    @abstractmethod
+    def open_range_sync(self, key: str, start: int, end: int) -> IO[bytes]:
+        pass
+
+    @abstractmethod
+    def put_sync(self, key: str, body: IO[bytes], content_type: str | None):
+        pass
+
+    @abstractmethod
+    def delete_sync(self, key: str):
+        pass
+
+    @abstractmethod
+    def create_multipart_upload_sync(
+        self, key: str, content_type: str | None
+    ) -> str:
+        pass
+
+    @abstractmethod
+    def upload_part_sync(
+        self, key: str, upload_id: str, part_number: int, data: bytes
+    ) -> dict:
+        pass
+
+    @abstractmethod
+    def complete_multipart_upload_sync(
+        self, key: str, upload_id: str, parts: list[dict]
+    ):
+        pass
+
+    @abstractmethod
+    def abort_multipart_upload_sync(self, key: str, upload_id: str):
+        pass
+
+
+class S3Storage(Storage):
+    def __init__(self, client: BaseClient, bucket: str, max_workers: int):
+        super().__init__(max_workers)
+        self.client = client
+        self.bucket = bucket
+
+    def get_sync(self, key: str) -> bytes:
+        try:
+            s3_object = self.client.get_object(Bucket=self.bucket, Key=key)
+        except self.client.exceptions.NoSuchKey:
+            raise StorageObjectNotFound(key) from None
+        with s3_object['Body'] as body:
+            return body.read()
+
+    def head_sync(self, key: str) -> ObjectInfo:
+        try:
+            s3_object = self.client.head_object(Bucket=self.bucket, Key=key)
+        except ClientError as e:
+            if e.response['Error']['Code'] in ('404', 'NoSuchKey'):
+                raise StorageObjectNotFound(key) from None
+            raise
+        return ObjectInfo(
+            size=s3_object['ContentLength'],
+            content_type=s3_object.get('ContentType', DEFAULT_CONTENT_TYPE),
+            etag=s3_object['ETag'],
+            last_modified=s3_object['LastModified'],
+        )
+
+    def open_range_sync(self, key: str, start: int, end: int) -> IO[bytes]:
+        try:
+            s3_object = self.client.get_object(
+                Bucket=self.bucket, Key=key, Range=f'bytes={start}-{end}'
+            )
+        except self.client.exceptions.NoSuchKey:
+            raise StorageObjectNotFound(key) from None
+        return s3_object['Body']
+
+    def presigned_url(self, key: str, expires_in: int) -> str | None:
+        return self.client.generate_presigned_url(
+            'get_object',
+            Params={'Bucket': self.bucket, 'Key': key},
+            ExpiresIn=expires_in,
+        )
+
+    def put_sync(self, key: str, body: IO[bytes], content_type: str | None):
+        extra_args = {'ContentType': content_type} if content_type else {}
+        self.client.put_object(
+            Bucket=self.bucket, Key=key, Body=body, **extra_args
+        )
+
+    def delete_sync(self, key: str):
+        try:
+            self.client.delete_object(Bucket=self.bucket, Key=key)
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'NoSuchKey':
+                raise
+
+    def create_multipart_upload_sync(
+        self, key: str, content_type: str | None
+    ) -> str:
+        extra_args = {'ContentType': content_type} if content_type else {}
+        upload = self.client.create_multipart_upload(
+            Bucket=self.bucket, Key=key, **extra_args
+        )
+        return upload['UploadId']
+
+    def upload_part_sync(
+        self, key: str, upload_id: str, part_number: int, data: bytes
+    ) -> dict:
+        part = self.client.upload_part(
+            Bucket=self.bucket,
+            Key=key,
+            UploadId=upload_id,
+            PartNumber=part_number,
+            Body=data,
+        )
+        return {'PartNumber': part_number, 'ETag': part['ETag']}
+
+    def complete_multipart_upload_sync(
+        self, key: str, upload_id: str, parts: list[dict]
+    ):
+        self.client.complete_multipart_upload(
+            Bucket=self.bucket,
+            Key=key,
+            UploadId=upload_id,
+            MultipartUpload={'Parts': parts},
+        )
+
+    def abort_multipart_upload_sync(self, key: str, upload_id: str):
+        self.client.abort_multipart_upload(
+            Bucket=self.bucket, Key=key, UploadId=upload_id
+        )
+
+
+class LocalStorage(Storage):
+    def __init__(self, root: str, max_workers: int):
+        super().__init__(max_workers)
+        self.root = Path(root).resolve()
+
+    def path(self, key: str) -> Path:
+        path = (self.root / key).resolve()
+        if not path.is_relative_to(self.root):
+            raise ValueError(f'Invalid storage key: {key}')
+        return path
+
+    def get_sync(self, key: str) -> bytes:
+        try:
+            return self.path(key).read_bytes()
+        except FileNotFoundError:
+            raise StorageObjectNotFound(key) from None
+
+    def head_sync(self, key: str) -> ObjectInfo:
+        try:
+            stat = self.path(key).stat()
+        except FileNotFoundError:
+            raise StorageObjectNotFound(key) from None
+        content_type, _ = mimetypes.guess_type(key)
+        return ObjectInfo(
+            size=stat.st_size,
+            content_type=content_type or DEFAULT_CONTENT_TYPE,
+            etag=f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"',
+            last_modified=datetime.fromtimestamp(stat.st_mtime, timezone.utc),
+        )
+
+    def open_range_sync(self, key: str, start: int, end: int) -> IO[bytes]:
+        try:
+            file = self.path(key).open('rb')
+        except FileNotFoundError:
+            raise StorageObjectNotFound(key) from None
+        file.seek(start)
+        return RangeReader(file, end - start + 1)
+
+    def put_sync(self, key: str, body: IO[bytes], content_type: str | None):
+        path = self.path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with path.open('wb') as file:
+            shutil.copyfileobj(body, file)
+
+    def delete_sync(self, key: str):
+        self.path(key).unlink(missing_ok=True)
+
+    def multipart_path(self, upload_id: str) -> Path:
+        return self.path(f'.multipart/{upload_id}')
+
+    def create_multipart_upload_sync(
+        self, key: str, content_type: str | None
+    ) -> str:
+        upload_id = uuid.uuid4().hex
+        self.multipart_path(upload_id).mkdir(parents=True)
+        return upload_id
+
+    def upload_part_sync(
+        self, key: str, upload_id: str, part_number: int, data: bytes
+    ) -> dict:
+        part_path = self.multipart_path(upload_id) / f'{part_number:05d}'
+        part_path.write_bytes(data)
+        return {'PartNumber': part_number, 'ETag': f'"{len(data):x}"'}
+
+    def complete_multipart_upload_sync(
+        self, key: str, upload_id: str, parts: list[dict]
+    ):
+        path = self.path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        upload_path = self.multipart_path(upload_id)
+        with path.open('wb') as file:
+            for part in sorted(parts, key=lambda part: part['PartNumber']):
+                part_path = upload_path / f'{part["PartNumber"]:05d}'
+                with part_path.open('rb') as part_file:
+                    shutil.copyfileobj(part_file, file)
+        shutil.rmtree(upload_path)
+
+    def abort_multipart_upload_sync(self, key: str, upload_id: str):
+        shutil.rmtree(self.multipart_path(upload_id), ignore_errors=True)
+
+
+class RangeReader:
+    def __init__(self, file: IO[bytes], length: int):
+        self.file = file
+        self.remaining = length
+
+    def read(self, size: int) -> bytes:
+        chunk = self.file.read(min(size, self.remaining))
+        self.remaining -= len(chunk)
+        return chunk
+
+    def close(self):
+        self.file.close()
+
+
+@lru_cache
+def get_storage() -> Storage:
+    match env.STORAGE_BACKEND:
+        case 'local':
+            return LocalStorage(
+                env.LOCAL_STORAGE_ROOT, env.S3_MAX_POOL_CONNECTIONS
+            )
+        case 's3':
+            return S3Storage(
+                get_s3_client(),
+                env.S3_BUCKET_NAME,
+                env.S3_MAX_POOL_CONNECTIONS,
+            )
+    raise ValueError(f'Unknown storage backend: {env.STORAGE_BACKEND}')
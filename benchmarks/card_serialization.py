@@ -0,0 +1,113 @@
+"""カード一覧のシリアライズ速度を、従来の経路と orjson の経路で比較する
+
+poetry run python -m benchmarks.card_serialization --cards 1000
+"""
+
+import argparse
+import json
+import timeit
+import uuid
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+import orjson
+from pydantic import TypeAdapter
+
+import api.schemas.card as card_schema
+import api.utils.fast_json as fast_json
+
+
+CardRow = namedtuple(
+    'CardRow',
+    [
+        'sentence',
+        'meaning',
+        'image_path',
+        'etymology',
+        'id',
+        'previous_answer_date',
+        'next_answer_date',
+        'retention_state',
+        'savings_score',
+        'updated_at',
+        'created_at',
+        'deck_id',
+    ],
+)
+
+card_list_adapter = TypeAdapter(list[card_schema.CardResponse])
+
+
+def make_rows(card_count: int) -> list[CardRow]:
+    now = datetime(2024, 1, 1, 12, 0, 0, 123456)
+    deck_id = uuid.uuid4()
+    return [
+        CardRow(
+            sentence=f'This is example sentence number {i}.',
+            meaning=f'これは例文 {i} の意味です。',
+            image_path=None if i % 3 else f'cards/images/{deck_id}/{i}.png',
+            etymology=None,
+            id=uuid.uuid4(),
+            previous_answer_date=None if i % 2 else now,
+            next_answer_date=now + timedelta(days=i % 30),
+            retention_state=False,
+            savings_score=i % 7 + 1,
+            updated_at=now,
+            created_at=now,
+            deck_id=deck_id,
+        )
+        for i in range(card_count)
+    ]
+
+
+def encode_with_models(rows: list[CardRow]) -> bytes:
+    # ルーターで model_validate し、FastAPI が response_model で再検証して
+    # JSONResponse で出力する従来の経路
+    cards = [card_schema.CardResponse.model_validate(row) for row in rows]
+    content = card_list_adapter.dump_python(
+        card_list_adapter.validate_python(cards), mode='json'
+    )
+    return json.dumps(
+        content,
+        ensure_ascii=False,
+        allow_nan=False,
+        separators=(',', ':'),
+    ).encode('utf-8')
+
+
+def encode_with_orjson(rows: list[CardRow]) -> bytes:
+    return orjson.dumps(fast_json.card_rows_to_dicts(rows))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--cards', type=int, default=1000)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--number', type=int, default=20)
+    args = parser.parse_args()
+
+    rows = make_rows(args.cards)
+    assert json.loads(encode_with_models(rows)) == json.loads(
+        encode_with_orjson(rows)
+    )
+
+    for name, encode in [
+        ('pydantic', encode_with_models),
+        ('orjson', encode_with_orjson),
+    ]:
+        best = min(
+            timeit.repeat(
+                lambda encode=encode: encode(rows),
+                repeat=args.repeat,
+                number=args.number,
+            )
+        )
+        per_call = best / args.number
+        print(
+            f'{name:>8}: {per_call * 1000:8.3f} ms / {args.cards} cards'
+            f' ({per_call / args.cards * 1e6:.2f} us / card)'
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,261 @@
+"""API の負荷試験ハーネス
+
+SQLite (aiosqlite) とローカルストレージで api.main:app をプロセス内に起動し、
+ユーザー・デッキ・カードを投入したうえで、仮想ユーザーごとに
+ログイン → ダッシュボード → 復習 → カード作成 → 画像アップロード
+のシナリオを並行に実行して、ルートごとのスループットと p50/p95/p99 を出力する。
+
+    poetry run python -m benchmarks.load_test --users 20 --iterations 10
+
+--output で結果を JSON に保存し、次回 --baseline に渡すと
+p95 が --tolerance を超えて悪化したルートがある場合に終了コード 1 を返す。
+--db-url で既存の DB を指定すると全テーブルを作り直すため、
+--reset-schema を併せて指定する必要がある。
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+from collections import defaultdict
+
+import numpy as np
+
+from tests.helpers import (
+    PASSWORD,
+    PNG_IMAGE,
+    configure_environment,
+    create_schema,
+    seed,
+)
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    def record(self, route: str, elapsed: float, status_code: int):
+        self.latencies[route].append(elapsed)
+        if status_code >= 400:
+            self.errors[route] += 1
+
+    def summary(self, wall_time: float) -> dict:
+        summary = {}
+        for route, latencies in sorted(self.latencies.items()):
+            p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) * 1000
+            summary[route] = {
+                'count': len(latencies),
+                'errors': self.errors[route],
+                'rps': len(latencies) / wall_time,
+                'p50_ms': p50,
+                'p95_ms': p95,
+                'p99_ms': p99,
+            }
+        return summary
+
+
+async def request(
+    client, recorder: Recorder, route: str, method: str, url: str, **kwargs
+):
+    started_at = time.perf_counter()
+    response = await client.request(method, url, **kwargs)
+    recorder.record(
+        route, time.perf_counter() - started_at, response.status_code
+    )
+    return response
+
+
+async def run_virtual_user(client, recorder: Recorder, user: dict, args):
+    response = await request(
+        client,
+        recorder,
+        'POST /login',
+        'POST',
+        '/login',
+        json={'email': user['email'], 'password': PASSWORD},
+    )
+    if response.status_code != 200:
+        return
+    headers = {'Authorization': f'Bearer {response.json()["access_token"]}'}
+
+    for _ in range(args.iterations):
+        deck_id = str(random.choice(user['deck_ids']))
+
+        # ダッシュボード
+        await request(
+            client,
+            recorder,
+            'GET /decks-with-card-count',
+            'GET',
+            '/decks-with-card-count',
+            headers=headers,
+        )
+        await request(
+            client,
+            recorder,
+            'GET /user-statistics',
+            'GET',
+            '/user-statistics',
+            headers=headers,
+        )
+
+        # 復習
+        response = await request(
+            client,
+            recorder,
+            'GET /review-queue',
+            'GET',
+            '/review-queue',
+            params={'limit': args.review_size},
+            headers=headers,
+        )
+        if response.status_code == 200 and response.json():
+            await request(
+                client,
+                recorder,
+                'PUT /card-answers',
+                'PUT',
+                '/card-answers',
+                json={
+                    'answers': [
+                        {
+                            'card_id': card['id'],
+                            'is_correct': random.random() < 0.8,
+                        }
+                        for card in response.json()
+                    ]
+                },
+                headers=headers,
+            )
+
+        await request(
+            client,
+            recorder,
+            'GET /cards/{deck_id}',
+            'GET',
+            f'/cards/{deck_id}',
+            params={'limit': 100},
+            headers=headers,
+        )
+
+        # カード作成
+        await request(
+            client,
+            recorder,
+            'POST /card/{deck_id}',
+            'POST',
+            f'/card/{deck_id}',
+            json={'sentence': 'New sentence', 'meaning': '新しい例文'},
+            headers=headers,
+        )
+
+        # 画像アップロード
+        await request(
+            client,
+            recorder,
+            'POST /upload-card-image/{deck_id}/stream',
+            'POST',
+            f'/upload-card-image/{deck_id}/stream',
+            params={'filename': 'loadtest.png'},
+            content=PNG_IMAGE,
+            headers=headers,
+        )
+
+
+async def run(args) -> tuple[dict, float]:
+    import httpx
+
+    from api.main import app
+
+    await create_schema()
+    users = await seed(args.users, args.decks, args.cards, args.seed)
+
+    recorder = Recorder()
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(
+        transport=transport, base_url='http://loadtest', timeout=60
+    ) as client:
+        started_at = time.perf_counter()
+        await asyncio.gather(
+            *[run_virtual_user(client, recorder, user, args) for user in users]
+        )
+        wall_time = time.perf_counter() - started_at
+
+    return recorder.summary(wall_time), wall_time
+
+
+def print_summary(summary: dict, wall_time: float):
+    total = sum(route['count'] for route in summary.values())
+    print(
+        f'{"route":<42}{"count":>7}{"errors":>8}{"rps":>9}'
+        f'{"p50 ms":>9}{"p95 ms":>9}{"p99 ms":>9}'
+    )
+    for name, route in summary.items():
+        print(
+            f'{name:<42}{route["count"]:>7}{route["errors"]:>8}'
+            f'{route["rps"]:>9.1f}{route["p50_ms"]:>9.1f}'
+            f'{route["p95_ms"]:>9.1f}{route["p99_ms"]:>9.1f}'
+        )
+    print(
+        f'total: {total} requests in {wall_time:.2f}s ({total / wall_time:.1f} rps)'
+    )
+
+
+def find_regressions(summary: dict, baseline: dict, tolerance: float) -> list:
+    regressions = []
+    for name, route in summary.items():
+        if name not in baseline:
+            continue
+        limit = baseline[name]['p95_ms'] * (1 + tolerance)
+        if route['p95_ms'] > limit:
+            regressions.append(
+                (name, baseline[name]['p95_ms'], route['p95_ms'])
+            )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--decks', type=int, default=5)
+    parser.add_argument('--cards', type=int, default=200)
+    parser.add_argument('--iterations', type=int, default=10)
+    parser.add_argument('--review-size', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--db-url')
+    parser.add_argument('--reset-schema', action='store_true')
+    parser.add_argument('--work-dir')
+    parser.add_argument('--output')
+    parser.add_argument('--baseline')
+    parser.add_argument('--tolerance', type=float, default=0.2)
+    args = parser.parse_args()
+    # 既存の DB を指定した場合は、全テーブルを削除してよいか明示させる
+    if args.db_url and not args.reset_schema:
+        parser.error(
+            '--db-url drops and recreates every table; '
+            'pass --reset-schema to confirm'
+        )
+
+    configure_environment(args.db_url, args.work_dir)
+    summary, wall_time = asyncio.run(run(args))
+    print_summary(summary, wall_time)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(summary, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = find_regressions(summary, baseline, args.tolerance)
+        for name, before, after in regressions:
+            print(f'regression: {name} p95 {before:.1f}ms -> {after:.1f}ms')
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,221 @@
+"""RedisCacheBackend のテスト用の、プロセス内で動く Redis の代わり
+
+RedisCacheBackend が使うコマンド (GET/SET/MGET/DEL/INCR/PEXPIRE/SCAN、
+WATCH/MULTI/EXEC、PUBLISH/SUBSCRIBE) だけを redis.asyncio と同じ呼び出し方で
+実装する。同じ FakeRedisServer を共有するクライアントは、別ワーカーの
+接続として振る舞う。
+"""
+
+import asyncio
+import fnmatch
+import time
+from typing import Awaitable, Callable
+
+import redis.asyncio as redis
+
+
+class FakeRedisServer:
+    def __init__(self):
+        self.data: dict[str, tuple[bytes, float | None]] = {}
+        # WATCH 用。キーが書き込まれるたびに進める
+        self.revisions: dict[str, int] = {}
+        self.subscribers: dict[str, list[asyncio.Queue]] = {}
+        self.connected = True
+
+    def check_connection(self):
+        if not self.connected:
+            raise redis.ConnectionError('Fake Redis server is down')
+
+    def get(self, key: str) -> bytes | None:
+        entry = self.data.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self.data[key]
+            return None
+        return value
+
+    def set(self, key: str, value: bytes | str, px: int | None = None):
+        if isinstance(value, str):
+            value = value.encode()
+        expires_at = None if px is None else time.monotonic() + px / 1000
+        self.data[key] = (value, expires_at)
+        self.touch(key)
+
+    def delete(self, *keys: str | bytes) -> int:
+        deleted = 0
+        for key in keys:
+            if isinstance(key, bytes):
+                key = key.decode()
+            if self.get(key) is not None:
+                deleted += 1
+            self.data.pop(key, None)
+            self.touch(key)
+        return deleted
+
+    def incr(self, key: str) -> int:
+        value = int(self.get(key) or 0) + 1
+        expires_at = self.data[key][1] if key in self.data else None
+        self.data[key] = (str(value).encode(), expires_at)
+        self.touch(key)
+        return value
+
+    def pexpire(self, key: str, px: int) -> bool:
+        value = self.get(key)
+        if value is None:
+            return False
+        self.data[key] = (value, time.monotonic() + px / 1000)
+        self.touch(key)
+        return True
+
+    def publish(self, channel: str, message: bytes | str) -> int:
+        if isinstance(message, str):
+            message = message.encode()
+        queues = self.subscribers.get(channel, [])
+        for queue in queues:
+            queue.put_nowait(
+                {'type': 'message', 'channel': channel, 'data': message}
+            )
+        return len(queues)
+
+    def touch(self, key: str):
+        self.revisions[key] = self.revisions.get(key, 0) + 1
+
+
+class FakeRedis:
+    def __init__(
+        self,
+        server: FakeRedisServer,
+        after_read: Callable[[], Awaitable[None]] | None = None,
+    ):
+        self.server = server
+        # MGET が値を読んでから応答を返すまでの間に呼ばれる
+        self.after_read = after_read
+
+    async def get(self, key: str) -> bytes | None:
+        self.server.check_connection()
+        return self.server.get(key)
+
+    async def mget(self, *keys: str) -> list[bytes | None]:
+        self.server.check_connection()
+        values = [self.server.get(key) for key in keys]
+        if self.after_read is not None:
+            await self.after_read()
+        return values
+
+    async def set(self, key: str, value: bytes, px: int | None = None):
+        self.server.check_connection()
+        self.server.set(key, value, px)
+        return True
+
+    async def delete(self, *keys: str | bytes) -> int:
+        self.server.check_connection()
+        return self.server.delete(*keys)
+
+    async def publish(self, channel: str, message: bytes | str) -> int:
+        self.server.check_connection()
+        return self.server.publish(channel, message)
+
+    async def scan_iter(self, match: str = '*'):
+        self.server.check_connection()
+        for key in list(self.server.data):
+            if fnmatch.fnmatchcase(key, match):
+                yield key.encode()
+
+    def pipeline(self, transaction: bool = True) -> 'FakePipeline':
+        return FakePipeline(self.server)
+
+    def pubsub(self) -> 'FakePubSub':
+        return FakePubSub(self.server)
+
+    async def aclose(self):
+        pass
+
+
+class FakePipeline:
+    def __init__(self, server: FakeRedisServer):
+        self.server = server
+        self.commands: list[tuple[str, tuple, dict]] = []
+        self.watched: dict[str, int] = {}
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.commands.clear()
+        self.watched.clear()
+
+    async def watch(self, *keys: str):
+        self.server.check_connection()
+        for key in keys:
+            self.watched[key] = self.server.revisions.get(key, 0)
+
+    async def get(self, key: str) -> bytes | None:
+        # WATCH 後の MULTI 前は即時実行される
+        self.server.check_connection()
+        return self.server.get(key)
+
+    def multi(self):
+        pass
+
+    def set(self, key: str, value: bytes, px: int | None = None):
+        self.commands.append(('set', (key, value), {'px': px}))
+        return self
+
+    def delete(self, *keys: str):
+        self.commands.append(('delete', keys, {}))
+        return self
+
+    def incr(self, key: str):
+        self.commands.append(('incr', (key,), {}))
+        return self
+
+    def pexpire(self, key: str, px: int):
+        self.commands.append(('pexpire', (key, px), {}))
+        return self
+
+    def publish(self, channel: str, message: bytes | str):
+        self.commands.append(('publish', (channel, message), {}))
+        return self
+
+    async def execute(self) -> list:
+        self.server.check_connection()
+        try:
+            for key, revision in self.watched.items():
+                if self.server.revisions.get(key, 0) != revision:
+                    raise redis.WatchError('Watched variable changed.')
+            return [
+                getattr(self.server, name)(*args, **kwargs)
+                for name, args, kwargs in self.commands
+            ]
+        finally:
+            self.commands.clear()
+            self.watched.clear()
+
+
+class FakePubSub:
+    def __init__(self, server: FakeRedisServer):
+        self.server = server
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self.channels: list[str] = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        for channel in self.channels:
+            self.server.subscribers[channel].remove(self.queue)
+        self.channels.clear()
+
+    async def subscribe(self, channel: str):
+        self.server.check_connection()
+        self.server.subscribers.setdefault(channel, []).append(self.queue)
+        self.channels.append(channel)
+        self.queue.put_nowait(
+            {'type': 'subscribe', 'channel': channel, 'data': 1}
+        )
+
+    async def listen(self):
+        while True:
+            yield await self.queue.get()
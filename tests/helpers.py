@@ -0,0 +1,133 @@
+"""テストとベンチマークで共有する環境設定とデータ投入
+
+api.utils.env は import 時に環境変数を読むため、api を import する前に
+configure_environment を呼び出す。
+"""
+
+import os
+import random
+import tempfile
+import uuid
+from datetime import datetime, timedelta
+from functools import cache
+
+
+PASSWORD = 'loadtest-password'
+PNG_IMAGE = b'\x89PNG\r\n\x1a\n' + bytes(32 * 1024)
+INTERNAL_API_TOKEN = 'test-internal-token'
+SEED_BATCH_SIZE = 1000
+
+
+def configure_environment(
+    db_url: str | None = None, work_dir: str | None = None
+) -> str:
+    work_dir = work_dir or tempfile.mkdtemp(prefix='loadtest-')
+    os.environ['DB_URL'] = db_url or (
+        f'sqlite+aiosqlite:///{os.path.join(work_dir, "loadtest.db")}'
+    )
+    os.environ['STORAGE_BACKEND'] = 'local'
+    os.environ['LOCAL_STORAGE_ROOT'] = os.path.join(work_dir, 'storage')
+    os.environ.setdefault('SECRET_KEY', 'loadtest-secret-key')
+    os.environ.setdefault('ALGORITHM', 'HS256')
+    os.environ.setdefault('ACCESS_TOKEN_EXPIRE_MINUTES', '60')
+    return work_dir
+
+
+@cache
+def configure_test_environment() -> str:
+    # テストモジュールごとに呼ばれるが、設定は最初の1回だけ行う
+    os.environ['INTERNAL_API_TOKEN'] = INTERNAL_API_TOKEN
+    return configure_environment(work_dir=tempfile.mkdtemp(prefix='tests-'))
+
+
+async def create_schema():
+    # 全テーブルを削除して作り直すため、使い捨ての DB に対してだけ呼び出す
+    from api.db import Base, async_engine
+    import api.models.user  # noqa: F401
+    import api.models.auth  # noqa: F401
+    import api.models.deck  # noqa: F401
+    import api.models.card  # noqa: F401
+
+    async with async_engine.begin() as connection:
+        if connection.dialect.name == 'sqlite':
+            await connection.exec_driver_sql('PRAGMA journal_mode=WAL')
+        await connection.run_sync(Base.metadata.drop_all)
+        await connection.run_sync(Base.metadata.create_all)
+
+
+async def seed(
+    users: int, decks: int, cards: int, random_seed: int = 0
+) -> list[dict]:
+    from sqlalchemy import insert
+
+    import api.models.card as card_model
+    import api.models.deck as deck_model
+    import api.models.user as user_model
+    import api.utils.auth as auth_util
+    from api.db import async_engine
+    from api.utils.deck_counters import rebuild_deck_counters
+
+    random.seed(random_seed)
+    password_hash = auth_util.get_password_hash(PASSWORD)
+    now = datetime.now().replace(microsecond=0)
+
+    seeded_users = []
+    user_rows = []
+    deck_rows = []
+    card_rows = []
+    for i in range(users):
+        user_id = uuid.uuid4()
+        deck_ids = [uuid.uuid4() for _ in range(decks)]
+        seeded_users.append(
+            {'email': f'loadtest{i}@example.com', 'deck_ids': deck_ids}
+        )
+        user_rows.append(
+            {
+                'id': user_id,
+                'username': f'loadtest{i}',
+                'email': f'loadtest{i}@example.com',
+                'password': password_hash,
+                'is_active': True,
+            }
+        )
+        for deck_id in deck_ids:
+            deck_rows.append(
+                {'id': deck_id, 'name': f'deck {deck_id}', 'user_id': user_id}
+            )
+            for j in range(cards):
+                previous_answer_date = now - timedelta(
+                    seconds=random.randint(0, 30 * 86400)
+                )
+                card_rows.append(
+                    {
+                        'id': uuid.uuid4(),
+                        'sentence': f'Example sentence {j} for load testing.',
+                        'meaning': f'負荷試験用の例文 {j}',
+                        'previous_answer_date': previous_answer_date,
+                        'next_answer_date': previous_answer_date
+                        + timedelta(seconds=random.randint(0, 14 * 86400)),
+                        'savings_score': random.randint(1, 7),
+                        'retention_state': False,
+                        'deck_id': deck_id,
+                        'user_id': user_id,
+                    }
+                )
+
+    async with async_engine.begin() as connection:
+        await connection.execute(insert(user_model.User), user_rows)
+        await connection.execute(
+            insert(user_model.UserSettings),
+            [{'user_id': row['id']} for row in user_rows],
+        )
+        await connection.execute(
+            insert(user_model.UserSummary),
+            [{'user_id': row['id']} for row in user_rows],
+        )
+        await connection.execute(insert(deck_model.Deck), deck_rows)
+        for i in range(0, len(card_rows), SEED_BATCH_SIZE):
+            await connection.execute(
+                insert(card_model.Card), card_rows[i : i + SEED_BATCH_SIZE]
+            )
+        await connection.run_sync(rebuild_deck_counters)
+
+    return seeded_users
@@ -0,0 +1,214 @@
+"""api.utils.cache のバックエンドのテスト
+
+Redis はプロセス内の代わり (tests/fake_redis.py) を使う。
+
+poetry run python -m unittest discover tests
+"""
+
+import asyncio
+import unittest
+import uuid
+
+from tests.fake_redis import FakeRedis, FakeRedisServer
+from tests.helpers import configure_test_environment
+
+
+# api.utils.env は import 時に環境変数を読むため、api の import より先に設定する
+configure_test_environment()
+
+KEY_PREFIX = 'test'
+
+
+def get_namespace():
+    from api.utils.cache import CacheNamespace
+
+    return CacheNamespace('numbers', 60, 100, int)
+
+
+async def wait_for_subscriber(backend):
+    # 購読を始めたときのローカルコピーの破棄を済ませてからテストする
+    while not backend.client.server.subscribers.get(backend.channel):
+        await asyncio.sleep(0)
+    await asyncio.sleep(0)
+
+
+async def wait_for_invalidations():
+    # Pub/Sub のメッセージを購読タスクに処理させる
+    for _ in range(3):
+        await asyncio.sleep(0)
+
+
+class RedisCacheBackendTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.server = FakeRedisServer()
+        self.backends = []
+        self.namespace = get_namespace()
+
+    async def asyncTearDown(self):
+        for backend in self.backends:
+            await backend.stop()
+
+    async def start_backend(self, local_ttl: float = 30, after_read=None):
+        from api.utils.cache import RedisCacheBackend
+
+        backend = RedisCacheBackend(
+            FakeRedis(self.server, after_read),
+            KEY_PREFIX,
+            local_ttl,
+            reconnect_seconds=0,
+        )
+        backend.start()
+        self.backends.append(backend)
+        await wait_for_subscriber(backend)
+        return backend
+
+    async def test_delete_evicts_other_local_copies(self):
+        writer = await self.start_backend()
+        reader = await self.start_backend()
+        await writer.set(self.namespace, 'a', 1)
+        self.assertEqual(await reader.get(self.namespace, 'a'), 1)
+
+        # Redis の値だけ書き換えても、ローカルコピーが返る
+        self.server.set(f'{KEY_PREFIX}:numbers:a', b'2')
+        self.assertEqual(await reader.get(self.namespace, 'a'), 1)
+
+        await writer.delete(self.namespace, 'a')
+        await wait_for_invalidations()
+        self.assertIsNone(await reader.local.get(self.namespace, 'a'))
+        self.assertIsNone(await reader.get(self.namespace, 'a'))
+
+    async def test_clear_evicts_other_local_copies(self):
+        writer = await self.start_backend()
+        reader = await self.start_backend()
+        await writer.set(self.namespace, 'a', 1)
+        self.assertEqual(await reader.get(self.namespace, 'a'), 1)
+
+        await writer.clear()
+        await wait_for_invalidations()
+        self.assertIsNone(await reader.get(self.namespace, 'a'))
+        self.assertEqual(
+            [key for key in self.server.data if key.startswith(KEY_PREFIX)],
+            [],
+        )
+
+    async def test_fill_is_dropped_after_delete(self):
+        from api.utils.cache import MISSING
+
+        filler = await self.start_backend()
+        writer = await self.start_backend()
+        value, version = await filler.get_versioned(self.namespace, 'a')
+        self.assertIs(value, MISSING)
+
+        await writer.delete(self.namespace, 'a')
+        await wait_for_invalidations()
+        await filler.set(self.namespace, 'a', 1, version)
+
+        self.assertIsNone(self.server.get(f'{KEY_PREFIX}:numbers:a'))
+        self.assertIsNone(await filler.local.get(self.namespace, 'a'))
+        self.assertIsNone(await filler.get(self.namespace, 'a'))
+
+    async def test_fill_is_stored_without_delete(self):
+        backend = await self.start_backend()
+        value, version = await backend.get_versioned(self.namespace, 'a')
+        await backend.set(self.namespace, 'a', 1, version)
+        self.assertEqual(self.server.get(f'{KEY_PREFIX}:numbers:a'), b'1')
+        self.assertEqual(await backend.local.get(self.namespace, 'a'), 1)
+
+    async def test_invalidation_during_read_is_not_cached_locally(self):
+        writer = await self.start_backend()
+
+        async def delete_during_read():
+            await writer.delete(self.namespace, 'a')
+            await wait_for_invalidations()
+
+        reader = await self.start_backend(after_read=delete_during_read)
+        await writer.set(self.namespace, 'a', 1)
+
+        # MGET の応答は削除前の値だが、ローカルコピーには残らない
+        self.assertEqual(await reader.get(self.namespace, 'a'), 1)
+        self.assertIsNone(await reader.local.get(self.namespace, 'a'))
+
+    async def test_corrupt_entry_is_a_miss(self):
+        backend = await self.start_backend()
+        for data in [b'\x80', b'{', b'"one"', b'[1]']:
+            with self.subTest(data=data):
+                self.server.set(f'{KEY_PREFIX}:numbers:a', data)
+                errors = backend.errors.value
+                self.assertEqual(await backend.get(self.namespace, 'a', -1), -1)
+                self.assertEqual(backend.errors.value, errors + 1)
+                self.assertIsNone(await backend.local.get(self.namespace, 'a'))
+
+    async def test_values_round_trip(self):
+        from api.cruds.deck import ANSWER_REPLAY_COUNTS_CACHE
+        from api.cruds.user import ACTIVE_USER_CACHE, LEVEL_INTERVALS_CACHE
+        from api.db import RECENT_WRITES_CACHE
+        from api.schemas.user import ActiveUser
+
+        writer = await self.start_backend()
+        reader = await self.start_backend()
+        values = [
+            (
+                ACTIVE_USER_CACHE,
+                ActiveUser(
+                    id=uuid.uuid4(),
+                    username='user',
+                    email='user@example.com',
+                    is_active=True,
+                ),
+            ),
+            (LEVEL_INTERVALS_CACHE, (1, 2, 4, 8)),
+            (ANSWER_REPLAY_COUNTS_CACHE, {uuid.uuid4(): 3}),
+            (RECENT_WRITES_CACHE, True),
+        ]
+        for namespace, value in values:
+            with self.subTest(namespace=namespace.name):
+                await writer.set(namespace, 'a', value)
+                self.assertEqual(await reader.get(namespace, 'a'), value)
+        self.assertEqual(reader.errors.value, 0)
+
+    async def test_local_copy_expires_before_remote_value(self):
+        backend = await self.start_backend(local_ttl=0.05)
+        await backend.set(self.namespace, 'a', 1)
+        self.assertEqual(await backend.local.get(self.namespace, 'a'), 1)
+
+        await asyncio.sleep(0.1)
+        self.assertIsNone(await backend.local.get(self.namespace, 'a'))
+        self.server.set(f'{KEY_PREFIX}:numbers:a', b'2')
+        self.assertEqual(await backend.get(self.namespace, 'a'), 2)
+
+    async def test_redis_errors_fall_back_to_miss(self):
+        backend = await self.start_backend()
+        self.server.connected = False
+        self.assertIsNone(await backend.get(self.namespace, 'a'))
+        await backend.delete(self.namespace, 'a')
+        self.assertEqual(backend.errors.value, 2)
+
+
+class LocalCacheBackendTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        from api.utils.cache import LocalCacheBackend
+
+        self.backend = LocalCacheBackend()
+        self.namespace = get_namespace()
+
+    async def test_fill_is_dropped_after_delete(self):
+        from api.utils.cache import MISSING
+
+        value, version = await self.backend.get_versioned(self.namespace, 'a')
+        self.assertIs(value, MISSING)
+
+        await self.backend.delete(self.namespace, 'a')
+        await self.backend.set(self.namespace, 'a', 1, version)
+        self.assertIsNone(await self.backend.get(self.namespace, 'a'))
+
+    async def test_fill_is_dropped_after_clear(self):
+        _, version = await self.backend.get_versioned(self.namespace, 'a')
+
+        await self.backend.clear()
+        await self.backend.set(self.namespace, 'a', 1, version)
+        self.assertIsNone(await self.backend.get(self.namespace, 'a'))
+
+    async def test_fill_is_stored_without_delete(self):
+        _, version = await self.backend.get_versioned(self.namespace, 'a')
+        await self.backend.set(self.namespace, 'a', 1, version)
+        self.assertEqual(await self.backend.get(self.namespace, 'a'), 1)
@@ -0,0 +1,107 @@
+"""PUT /card-answer/{card_id} の SQL 文数のテスト
+
+poetry run python -m unittest discover tests
+"""
+
+import unittest
+from datetime import datetime, timedelta
+
+from tests.helpers import (
+    PASSWORD,
+    configure_test_environment,
+    create_schema,
+    seed,
+)
+
+
+# api.utils.env は import 時に環境変数を読むため、api の import より先に設定する
+configure_test_environment()
+
+
+class CardAnswerQueryCountTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        import httpx
+        from sqlalchemy import event, select, update
+
+        import api.models.card as card_model
+        from api.db import async_engine
+        from api.main import app
+        from api.utils.deck_counters import rebuild_deck_counters
+
+        await create_schema()
+        users = await seed(users=1, decks=1, cards=3)
+        async with async_engine.begin() as connection:
+            # 投入データの出題日とレベルは乱数のため、正解でも不正解でも
+            # 出題日のバケットが移動するよう期限切れのレベル2にそろえる
+            await connection.execute(
+                update(card_model.Card).values(
+                    savings_score=2,
+                    retention_state=False,
+                    next_answer_date=datetime.now() - timedelta(days=2),
+                )
+            )
+            await connection.run_sync(rebuild_deck_counters)
+            result = await connection.execute(
+                select(card_model.Card.id).order_by(card_model.Card.id)
+            )
+            self.card_ids = [str(card_id) for card_id in result.scalars()]
+
+        self.client = httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=app), base_url='http://test'
+        )
+        response = await self.client.post(
+            '/login', json={'email': users[0]['email'], 'password': PASSWORD}
+        )
+        self.headers = {
+            'Authorization': f'Bearer {response.json()["access_token"]}'
+        }
+
+        self.statements = []
+        event.listen(
+            async_engine.sync_engine, 'before_cursor_execute', self.record
+        )
+
+    async def asyncTearDown(self):
+        from sqlalchemy import event
+
+        from api.db import async_engine
+
+        event.remove(
+            async_engine.sync_engine, 'before_cursor_execute', self.record
+        )
+        await self.client.aclose()
+        await async_engine.dispose()
+
+    def record(self, conn, cursor, statement, parameters, context, many):
+        self.statements.append(statement.split()[0])
+
+    async def answer(self, card_id: str, is_correct: bool) -> list[str]:
+        self.statements.clear()
+        response = await self.client.put(
+            f'/card-answer/{card_id}',
+            json={'is_correct': is_correct},
+            headers=self.headers,
+        )
+        self.assertEqual(response.status_code, 200, response.text)
+        return list(self.statements)
+
+    async def test_statements_with_cold_cache(self):
+        from api.utils.cache import get_cache_backend
+
+        for is_correct in [True, False]:
+            await get_cache_backend().clear()
+            statements = await self.answer(self.card_ids[0], is_correct)
+            # 認証ユーザーの取得、カードとレベル別間隔の取得、カードの更新、
+            # レベル別集計と出題日ヒストグラムの加算
+            self.assertEqual(
+                statements, ['SELECT', 'SELECT', 'UPDATE', 'INSERT', 'INSERT']
+            )
+
+    async def test_statements_with_warm_cache(self):
+        await self.answer(self.card_ids[1], True)
+        statements = await self.answer(self.card_ids[1], True)
+        self.assertEqual(statements, ['SELECT', 'UPDATE', 'INSERT', 'INSERT'])
+
+
+if __name__ == '__main__':
+    unittest.main()
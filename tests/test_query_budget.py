@@ -0,0 +1,372 @@
+"""ルートごとの SQL 文数が @query_budget の宣言を超えていないかのテスト
+
+全ルートを呼び出してリクエストごとの SQL 文数を数える。キャッシュは毎回
+クリアし、同じルートを条件を変えて複数回呼び出した場合は最も多い文数で
+判定する。予算を超えたルート、予算が宣言されていないルート、呼び出されなかった
+ルートがあると失敗する。
+
+    poetry run python -m unittest tests.test_query_budget
+"""
+
+import io
+import unittest
+from unittest import mock
+
+from tests.helpers import (
+    INTERNAL_API_TOKEN,
+    PNG_IMAGE,
+    configure_test_environment,
+    create_schema,
+)
+
+
+# api.utils.env は import 時に環境変数を読むため、api の import より先に設定する
+configure_test_environment()
+
+
+class StatementCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, conn, cursor, statement, parameters, context, many):
+        self.count += 1
+
+
+class BudgetChecker:
+    def __init__(self, client, budgets: dict[tuple[str, str], int]):
+        self.client = client
+        self.budgets = budgets
+        self.results: dict[tuple[str, str], tuple[int, int]] = {}
+        self.counter = StatementCounter()
+
+    async def call(
+        self, method: str, route: str, url: str | None = None, **kwargs
+    ):
+        from api.utils.cache import get_cache_backend
+
+        await get_cache_backend().clear()
+
+        self.counter.count = 0
+        response = await self.client.request(method, url or route, **kwargs)
+        statements, _ = self.results.get((method, route), (0, None))
+        self.results[(method, route)] = (
+            max(statements, self.counter.count),
+            response.status_code,
+        )
+        if response.status_code >= 400:
+            raise RuntimeError(
+                f'{method} {route} returned {response.status_code}: {response.text}'
+            )
+        return response
+
+
+async def get_verification_code(email: str) -> int:
+    from sqlalchemy import select
+
+    import api.models.auth as auth_model
+    from api.db import async_session
+
+    async with async_session() as session:
+        result = await session.execute(
+            select(auth_model.Verification.verification_code).filter_by(
+                email=email
+            )
+        )
+        return result.scalar_one()
+
+
+async def run_scenario(checker: BudgetChecker):
+    call = checker.call
+
+    # 認証
+    for email in ['budget@example.com', 'budget2@example.com']:
+        await call(
+            'POST',
+            '/signup',
+            json={'username': 'budget', 'email': email, 'password': 'pw'},
+        )
+    await call(
+        'POST',
+        '/signup-verify',
+        json={
+            'email': 'budget@example.com',
+            'verification_code': await get_verification_code(
+                'budget@example.com'
+            ),
+        },
+    )
+    await call(
+        'POST',
+        '/login-and-user-verify',
+        json={
+            'email': 'budget2@example.com',
+            'password': 'pw',
+            'verification_code': await get_verification_code(
+                'budget2@example.com'
+            ),
+        },
+    )
+    response = await call(
+        'POST',
+        '/login',
+        json={'email': 'budget@example.com', 'password': 'pw'},
+    )
+    headers = {'Authorization': f'Bearer {response.json()["access_token"]}'}
+    await call('GET', '/verify', headers=headers)
+
+    # ユーザー
+    await call('GET', '/user', headers=headers)
+    await call('GET', '/user-settings', headers=headers)
+    # レベルごとに間隔を変え、回答で出題日のバケットが移動するようにする
+    user_settings = {
+        name: {'month': 0, 'day': day, 'hour': 0}
+        for day, name in enumerate(
+            [
+                'level_one',
+                'level_two',
+                'level_three',
+                'level_four',
+                'level_five',
+                'level_six',
+                'level_seven',
+            ],
+            start=1,
+        )
+    }
+    await call('PUT', '/user-settings', json=user_settings, headers=headers)
+    await call('GET', '/user-statistics', headers=headers)
+
+    # デッキ
+    response = await call(
+        'POST', '/deck', json={'name': 'deck'}, headers=headers
+    )
+    deck_id = response.json()['id']
+    await call('GET', '/deck/{deck_id}', f'/deck/{deck_id}', headers=headers)
+    await call(
+        'PUT',
+        '/deck/{deck_id}',
+        f'/deck/{deck_id}',
+        json={'name': 'renamed'},
+        headers=headers,
+    )
+    await call('GET', '/decks', headers=headers)
+
+    # カード
+    card_ids = []
+    for i in range(3):
+        response = await call(
+            'POST',
+            '/card/{deck_id}',
+            f'/card/{deck_id}',
+            json={'sentence': f'sentence {i}', 'meaning': 'meaning'},
+            headers=headers,
+        )
+        card_ids.append(response.json()['id'])
+    card_id = card_ids[0]
+    await call('GET', '/decks-with-card-count', headers=headers)
+    await call('GET', '/card/{card_id}', f'/card/{card_id}', headers=headers)
+    await call(
+        'GET',
+        '/cards/{deck_id}',
+        f'/cards/{deck_id}',
+        params={'limit': 2},
+        headers=headers,
+    )
+    await call(
+        'GET',
+        '/cards/{deck_id}/export',
+        f'/cards/{deck_id}/export',
+        headers=headers,
+    )
+    await call(
+        'POST',
+        '/cards/{deck_id}/import',
+        f'/cards/{deck_id}/import',
+        files={
+            'upload_file': (
+                'cards.csv',
+                io.BytesIO(b'sentence,meaning\na,b\nc,d\n'),
+                'text/csv',
+            )
+        },
+        headers=headers,
+    )
+    await call(
+        'GET',
+        '/answer-replay-cards/{deck_id}',
+        f'/answer-replay-cards/{deck_id}',
+        headers=headers,
+    )
+    await call('GET', '/review-queue', headers=headers)
+    # 1枚目を最高レベルまで上げ、定着済みとそれ以外が混ざった回答を用意する
+    for _ in range(6):
+        await call(
+            'PUT',
+            '/card-answer/{card_id}',
+            f'/card-answer/{card_id}',
+            json={'is_correct': True},
+            headers=headers,
+        )
+    await call(
+        'PUT',
+        '/card-answers',
+        json={
+            'answers': [
+                {'card_id': card_ids[0], 'is_correct': True},
+                {'card_id': card_ids[1], 'is_correct': True},
+                {'card_id': card_ids[0], 'is_correct': True},
+                {'card_id': card_ids[2], 'is_correct': False},
+                {'card_id': card_ids[1], 'is_correct': True},
+            ]
+        },
+        headers=headers,
+    )
+    await call(
+        'PUT',
+        '/user-settings',
+        params={'reschedule': 'true'},
+        json=user_settings,
+        headers=headers,
+    )
+
+    # 画像
+    response = await call(
+        'POST',
+        '/upload-card-image/{deck_id}',
+        f'/upload-card-image/{deck_id}',
+        files={
+            'upload_image': ('image.png', io.BytesIO(PNG_IMAGE), 'image/png')
+        },
+        headers=headers,
+    )
+    await call(
+        'POST',
+        '/upload-card-image/{deck_id}/stream',
+        f'/upload-card-image/{deck_id}/stream',
+        params={'filename': 'image.png'},
+        content=PNG_IMAGE,
+        headers=headers,
+    )
+    await call(
+        'PUT',
+        '/card/{card_id}',
+        f'/card/{card_id}',
+        json={
+            'sentence': 'sentence',
+            'meaning': 'meaning',
+            'image_path': response.json(),
+        },
+        headers=headers,
+    )
+    await call(
+        'GET',
+        '/download-card-image/{card_id}',
+        f'/download-card-image/{card_id}',
+        headers=headers,
+    )
+    await call(
+        'GET',
+        '/card-image/{card_id}',
+        f'/card-image/{card_id}',
+        headers=headers,
+    )
+
+    # 削除
+    await call('DELETE', '/card/{card_id}', f'/card/{card_id}', headers=headers)
+    await call('DELETE', '/deck/{deck_id}', f'/deck/{deck_id}', headers=headers)
+
+    # 内部エンドポイント
+    internal_headers = {'X-Internal-Token': INTERNAL_API_TOKEN}
+    for route in [
+        '/internal/metrics',
+        '/internal/pool-stats',
+        '/internal/replica-stats',
+        '/internal/cache-stats',
+        '/internal/mail-stats',
+        '/internal/password-hasher-stats',
+    ]:
+        await call('GET', route, headers=internal_headers)
+
+
+def get_budgets(app) -> tuple[dict[tuple[str, str], int], list[str]]:
+    from fastapi.routing import APIRoute
+
+    from api.utils.profiling import get_query_budget
+
+    budgets = {}
+    missing = []
+    for route in app.routes:
+        if not isinstance(route, APIRoute):
+            continue
+        budget = get_query_budget(route)
+        for method in route.methods:
+            if budget is None:
+                missing.append(f'{method} {route.path}')
+            else:
+                budgets[(method, route.path)] = budget
+    return budgets, missing
+
+
+class QueryBudgetTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        import httpx
+        from sqlalchemy import event
+
+        from api.db import async_engine
+        from api.main import app
+        from api.utils.mail import mail_dispatcher
+
+        await create_schema()
+        # 確認コードは DB から読むため、SMTP には接続しない
+        patcher = mock.patch.object(mail_dispatcher, 'send')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.budgets, self.missing = get_budgets(app)
+        self.client = httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=app),
+            base_url='http://query-budget',
+        )
+        self.checker = BudgetChecker(self.client, self.budgets)
+        event.listen(
+            async_engine.sync_engine,
+            'before_cursor_execute',
+            self.checker.counter,
+        )
+
+    async def asyncTearDown(self):
+        from sqlalchemy import event
+
+        from api.db import async_engine
+        from api.utils.mail import mail_dispatcher
+
+        event.remove(
+            async_engine.sync_engine,
+            'before_cursor_execute',
+            self.checker.counter,
+        )
+        await mail_dispatcher.stop()
+        await self.client.aclose()
+        await async_engine.dispose()
+
+    async def test_routes_within_budget(self):
+        await run_scenario(self.checker)
+
+        problems = [f'{name}: no budget' for name in self.missing]
+        for key in sorted(self.budgets, key=lambda key: (key[1], key[0])):
+            method, path = key
+            budget = self.budgets[key]
+            if key not in self.checker.results:
+                problems.append(f'{method} {path}: not called')
+                continue
+            statements, _ = self.checker.results[key]
+            if statements > budget:
+                problems.append(
+                    f'{method} {path}: {statements} statements '
+                    f'(budget {budget})'
+                )
+        self.assertEqual(problems, [])
+
+
+if __name__ == '__main__':
+    unittest.main()